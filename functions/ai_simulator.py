@@ -1,14 +1,27 @@
-import random
+import functools
+import itertools
 import logging
-from typing import Dict, Any
+import math
+from random import Random, random as _rand
+from typing import Any, Dict, List, Optional, Union
 import os
 
-from config import ImageModels, AIModelsConfig
+from config import ImageModels, AIModelsConfig, ModelName
 
 # Configure logging for AI simulator module
 logger = logging.getLogger(__name__)
 
-logger.info("Initializing AI Simulator module...")
+# Maps each model value (e.g. "model-a") to its enum member
+_MODELS_BY_VALUE = {model.value: model for model in ImageModels}
+
+# Below this probability for the rarer outcome, create_batch() jumps between rare
+# outcomes with geometric gaps instead of drawing once per item.
+_GEOMETRIC_SKIP_MAX_RATE = 0.15
+
+
+def _configured_failure_rate() -> float:
+    """Returns the configured failure rate, allowing override via environment variable for testing."""
+    return float(os.getenv("AI_FAILURE_RATE", AIModelsConfig.DEFAULT_FAILURE_RATE))
 
 
 class AIChat:
@@ -16,46 +29,74 @@ class AIChat:
     Simulates an AI model for image generation with a configurable failure rate.
     """
     
-    def __init__(self, model: ImageModels, failure_rate: float = AIModelsConfig.DEFAULT_FAILURE_RATE):
+    __slots__ = (
+        "model",
+        "failure_rate",
+        "_rand",
+        "_log_interval",
+        "_success_counter",
+        "_success_result",
+        "_failure_result",
+        "_fixed_result",
+    )
+    
+    def __init__(self, model: Union[ImageModels, ModelName], failure_rate: Optional[float] = None,
+                 seed: Optional[int] = None):
         """
         Initializes the simulator with a specific model and failure rate.
         
         Args:
             model: The AI model to simulate (ImageModels.model_a or ImageModels.model_b).
-            failure_rate: The probability of generation failure (0.0 to 1.0).
+            failure_rate: The probability of generation failure (0.0 to 1.0). Defaults to the
+                AI_FAILURE_RATE environment override, then AIModelsConfig.DEFAULT_FAILURE_RATE.
+            seed: Optional seed for a private random stream, making the outcomes reproducible.
+                When omitted, the shared module-level generator is used.
         """
-        logger.info(f"=== Initializing AIChat simulator ===")
-        logger.info(f"Model: {model.value}")
-        logger.info(f"Failure rate: {failure_rate}")
+        # Validate and resolve the model in one lookup - accept both enum and string values
+        model_value = getattr(model, 'value', model)
+        resolved_model = _MODELS_BY_VALUE.get(model_value)
+        if resolved_model is None:
+            logger.error("Invalid model value: %s. Expected one of: %s", model_value, list(_MODELS_BY_VALUE))
+            raise TypeError(f"model must be one of: {list(_MODELS_BY_VALUE)}")
+        self.model = resolved_model
         
-        # Validate model - accept both enum and string values
-        if hasattr(model, 'value'):
-            model_value = model.value
-        else:
-            model_value = str(model)
+        if failure_rate is None:
+            failure_rate = _configured_failure_rate()
+        # Sanity check on a value that cannot change at runtime; stripped under `python -O`.
+        if __debug__ and not 0.0 <= failure_rate <= 1.0:
+            raise ValueError(f"failure_rate must be between 0.0 and 1.0, got {failure_rate}")
+        self.failure_rate = failure_rate
+        
+        self._rand = _rand if seed is None else Random(seed).random
+        
+        # Deterministic sampling of success logs: one in every 1 / SUCCESS_LOG_SAMPLE_RATE
+        # successes is logged (none at a rate of 0). The instance is shared across
+        # threads, so successes are numbered by an itertools.count, whose next() is
+        # a single atomic C call, rather than a read-modify-write accumulator.
+        log_sample_rate = AIModelsConfig.SUCCESS_LOG_SAMPLE_RATE
+        self._log_interval = max(1, round(1.0 / log_sample_rate)) if log_sample_rate > 0 else 0
+        self._success_counter = itertools.count(1)
         
-        valid_model_values = ["model-a", "model-b"]
-        if model_value not in valid_model_values:
-            logger.error(f"Invalid model value: {model_value}. Expected one of: {valid_model_values}")
-            raise TypeError(f"model must be one of: {valid_model_values}")
+        # Resolve the image URL with a single lookup; it is only needed here.
+        image_url = AIModelsConfig.PLACEHOLDER_URLS.get(self.model)
+        if image_url is None:
+            logger.error("No placeholder URL found for model: %s", self.model)
+            image_url = AIModelsConfig.FALLBACK_PLACEHOLDER_URL
         
-        # Store the actual enum if possible, otherwise create it
-        if hasattr(model, 'value'):
-            self.model = model
+        # The model and URL are fixed for the lifetime of the simulator, so both
+        # outcomes are built once here. Callers must treat them as read-only.
+        self._success_result = {"success": True, "imageUrl": image_url}
+        self._failure_result = {"success": False, "error": "AI model simulation failed."}
+        
+        # Rates of 0 and 1 have a fixed outcome, so create() can skip the RNG entirely.
+        if self.failure_rate <= 0.0:
+            self._fixed_result = self._success_result
+        elif self.failure_rate >= 1.0:
+            self._fixed_result = self._failure_result
         else:
-            # Convert string to enum
-            from config import ImageModels
-            if model_value == "model-a":
-                self.model = ImageModels.model_a
-            elif model_value == "model-b":
-                self.model = ImageModels.model_b
-        
-        # Use the configured failure rate, allowing override via environment variable for testing.
-        self.failure_rate = float(os.getenv("AI_FAILURE_RATE", AIModelsConfig.DEFAULT_FAILURE_RATE))
-        self.placeholder_urls = AIModelsConfig.PLACEHOLDER_URLS
-        
-        logger.info(f"AIChat simulator initialized successfully for {model.value}")
-        logger.debug(f"Available placeholder URLs: {list(self.placeholder_urls.keys())}")
+            self._fixed_result = None
+        
+        logger.info("AIChat simulator initialized for %s (failure rate: %s)", self.model.value, self.failure_rate)
 
     def create(self):
         """
@@ -63,33 +104,85 @@ class AIChat:
         
         Returns:
             A dictionary containing the success status and the image URL or an error message.
+            The dictionary is shared between calls and must not be mutated.
         """
-        logger.info(f"=== Starting AI image generation ===")
-        logger.info(f"Model: {self.model.value}")
-        logger.info(f"Failure rate: {self.failure_rate}")
+        if self._fixed_result is not None:
+            return self._fixed_result
         
         # Simulate a potential failure based on the configured rate.
-        if random.random() < self.failure_rate:
-            logger.warning(f"AI model {self.model.value} simulation FAILED (failure rate: {self.failure_rate * 100}%)")
-            return {"success": False, "error": "AI model simulation failed."}
-        
-        logger.info(f"AI model {self.model.value} simulation SUCCEEDED.")
-        
-        # Get image URL using the enum as key
-        try:
-            image_url = self.placeholder_urls[self.model]
-        except KeyError:
-            logger.error(f"No placeholder URL found for model: {self.model}")
-            logger.debug(f"Available keys in placeholder_urls: {list(self.placeholder_urls.keys())}")
-            # Fallback to a default URL
-            image_url = "https://via.placeholder.com/512x512?text=Generated+Image"
-        logger.debug(f"Selected placeholder URL: {image_url}")
-        
-        success_result = {
-            "success": True,
-            "imageUrl": image_url
-        }
-        logger.info(f"Returning success result: {success_result}")
-        return success_result
+        if self._rand() < self.failure_rate:
+            logger.warning("AI model %s simulation FAILED (failure rate: %s%%)", self.model.value, self.failure_rate * 100)
+            return self._failure_result
+        
+        if self._log_interval and next(self._success_counter) % self._log_interval == 0:
+            logger.info("AI model %s simulation SUCCEEDED (sampled)", self.model.value)
+        return self._success_result
+
+    def create_batch(self, n: int) -> List[Dict[str, Any]]:
+        """
+        Simulates `n` image generations in one call.
+        
+        Args:
+            n: The number of generations to simulate.
+        
+        Returns:
+            A list of `n` result dictionaries, in the same shape as `create()` returns.
+            The dictionaries are shared and must not be mutated.
+        """
+        if self._fixed_result is not None:
+            return [self._fixed_result] * n
+        
+        # Bind everything the loop needs to locals so each draw is a single comparison.
+        rand = self._rand
+        failure_rate = self.failure_rate
+        success_result = self._success_result
+        failure_result = self._failure_result
+        
+        if min(failure_rate, 1.0 - failure_rate) <= _GEOMETRIC_SKIP_MAX_RATE:
+            # Fill with the common outcome and place the rare one at geometrically
+            # distributed gaps: about n * rare_rate draws instead of n.
+            if failure_rate <= 0.5:
+                common_result, rare_result, rare_rate = success_result, failure_result, failure_rate
+            else:
+                common_result, rare_result, rare_rate = failure_result, success_result, 1.0 - failure_rate
+            results = [common_result] * n
+            log = math.log
+            log_common = math.log1p(-rare_rate)
+            position = log(1.0 - rand()) / log_common
+            while position < n:
+                i = int(position)
+                results[i] = rare_result
+                position = i + 1 + log(1.0 - rand()) / log_common
+        else:
+            results = [failure_result if rand() < failure_rate else success_result for _ in range(n)]
+        
+        if logger.isEnabledFor(logging.INFO):
+            failed = sum(1 for result in results if result is failure_result)
+            logger.info("AI model %s batch simulation finished: %d succeeded, %d failed", self.model.value, n - failed, failed)
+        return results
 
-logger.info("AI Simulator module loaded successfully")
\ No newline at end of file
+
+@functools.lru_cache(maxsize=16)
+def _cached_ai_chat(model: Union[ImageModels, ModelName], failure_rate: float) -> AIChat:
+    return AIChat(model, failure_rate)
+
+
+def get_ai_chat(model: Union[ImageModels, ModelName], failure_rate: Optional[float] = None) -> AIChat:
+    """
+    Returns a shared AIChat for the given model and failure rate, creating it on first use.
+    
+    AIChat's only mutable state is the counter that samples success logs, and it is
+    advanced atomically, so one instance per (model, failure_rate) can serve every
+    request, including concurrent ones. The returned instance is shared and must not
+    be mutated.
+    
+    Args:
+        model: The AI model to simulate (enum member or its string value).
+        failure_rate: The probability of generation failure. Defaults to the configured rate.
+    """
+    if failure_rate is None:
+        failure_rate = _configured_failure_rate()
+    # Key the cache on the enum member, so "model-a" and ImageModels.model_a share an
+    # instance; unknown values are passed through for AIChat to reject
+    model = _MODELS_BY_VALUE.get(getattr(model, 'value', model), model)
+    return _cached_ai_chat(model, failure_rate)
@@ -1,18 +1,19 @@
 import logging
 from enum import Enum
 import os
+from types import MappingProxyType
+from typing import Final, Literal, Mapping
 
 # Configure logging for config module
 logger = logging.getLogger(__name__)
 
-logger.info("Loading configuration module...")
-
 class ImageModels(Enum):
     """Enum for the available AI models."""
     model_a = "model-a"
     model_b = "model-b"
 
-logger.info(f"ImageModels enum loaded with values: {[model.value for model in ImageModels]}")
+# Static type for the raw string values of ImageModels (e.g. from a request body).
+ModelName = Literal["model-a", "model-b"]
 
 
 class AnomalyThresholds:
@@ -23,13 +24,6 @@ class AnomalyThresholds:
     SIGNIFICANT_FAILURE_RATE = 20.0  # A failure rate that is considered high on its own
     FAILURE_RATE_SPIKE_MULTIPLIER = 2.0  # e.g., if failure rate is 2x higher than last week
 
-logger.info("AnomalyThresholds loaded with values:")
-logger.info(f"  - SUCCESS_RATE_DROP_RATIO: {AnomalyThresholds.SUCCESS_RATE_DROP_RATIO}")
-logger.info(f"  - USAGE_SPIKE_MULTIPLIER: {AnomalyThresholds.USAGE_SPIKE_MULTIPLIER}")
-logger.info(f"  - MIN_SAMPLES_FOR_ANOMALY: {AnomalyThresholds.MIN_SAMPLES_FOR_ANOMALY}")
-logger.info(f"  - SIGNIFICANT_FAILURE_RATE: {AnomalyThresholds.SIGNIFICANT_FAILURE_RATE}")
-logger.info(f"  - FAILURE_RATE_SPIKE_MULTIPLIER: {AnomalyThresholds.FAILURE_RATE_SPIKE_MULTIPLIER}")
-
 
 class AIModelsConfig:
     """
@@ -38,16 +32,14 @@ class AIModelsConfig:
     # Default failure rate for the AI simulation.
     DEFAULT_FAILURE_RATE = float(os.getenv("AI_DEFAULT_FAILURE_RATE", 0.05))
 
-    # Placeholder URLs for each simulated model.
-    PLACEHOLDER_URLS = {
+    # Fraction of successful generations that are logged (failures are always logged).
+    SUCCESS_LOG_SAMPLE_RATE = float(os.getenv("AI_SUCCESS_LOG_SAMPLE_RATE", 0.01))
+
+    # Placeholder URLs for each simulated model (read-only).
+    PLACEHOLDER_URLS: Final[Mapping[ImageModels, str]] = MappingProxyType({
         ImageModels.model_a: "https://storage.googleapis.com/proudcity/mebanenc/uploads/2018/02/placeholder-image.png",
         ImageModels.model_b: "https://www.russorizio.com/wp-content/uploads/2016/07/ef3-placeholder-image.jpg"
-    }
-
-logger.info("AIModelsConfig loaded with values:")
-logger.info(f"  - DEFAULT_FAILURE_RATE: {AIModelsConfig.DEFAULT_FAILURE_RATE}")
-logger.info(f"  - PLACEHOLDER_URLS count: {len(AIModelsConfig.PLACEHOLDER_URLS)}")
-for model, url in AIModelsConfig.PLACEHOLDER_URLS.items():
-    logger.debug(f"    - {model.value}: {url}")
+    })
 
-logger.info("Configuration module loaded successfully") 
\ No newline at end of file
+    # URL returned when a model has no entry in PLACEHOLDER_URLS.
+    FALLBACK_PLACEHOLDER_URL = "https://via.placeholder.com/512x512?text=Generated+Image"
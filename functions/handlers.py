@@ -1,14 +1,19 @@
 import json
 import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, List
-from flask import Request
+from types import MappingProxyType
+from typing import Dict, List
 import firebase_admin
 from firebase_admin import credentials, firestore
 from firebase_functions import https_fn, options
 from firebase_functions.scheduler_fn import on_schedule, ScheduledEvent
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
 
-from ai_simulator import AIChat
+from ai_simulator import get_ai_chat
 from config import ImageModels, AnomalyThresholds
 
 # Configure logging with detailed format
@@ -21,6 +26,14 @@ logger = logging.getLogger(__name__)
 
 options.set_global_options(max_instances=10)
 
+# The HTTP functions spend most of their time waiting on Firestore, so each
+# instance serves many requests at once and shares the client and catalog caches
+HTTP_FUNCTION_OPTIONS = {
+    "concurrency": 80,
+    "cpu": 1,
+    "memory": options.MemoryOption.MB_512,
+}
+
 # Initialize Firebase Admin SDK
 import os
 
@@ -28,24 +41,23 @@ import os
 os.environ['FIRESTORE_EMULATOR_HOST'] = os.getenv('FIRESTORE_EMULATOR_HOST', '127.0.0.1:8080')
 os.environ['FIREBASE_AUTH_EMULATOR_HOST'] = os.getenv('FIREBASE_AUTH_EMULATOR_HOST', '127.0.0.1:9099')
 
+class MockCredential(credentials.Base):
+    """Mock credential for the emulator, shared by the normal and fallback init paths"""
+    def get_credential(self):
+        # Return a mock credential that satisfies the SDK
+        from google.oauth2 import credentials as oauth2_credentials
+        return oauth2_credentials.Credentials(token='mock-token')
+
 if not firebase_admin._apps:
     logger.info("Checking Firebase Admin SDK initialization environment")
-    logger.info(f"FIRESTORE_EMULATOR_HOST: {os.getenv('FIRESTORE_EMULATOR_HOST')}")
-    logger.info(f"GCLOUD_PROJECT: {os.getenv('GCLOUD_PROJECT')}")
-    logger.info(f"GOOGLE_CLOUD_PROJECT: {os.getenv('GOOGLE_CLOUD_PROJECT')}")
+    logger.info("FIRESTORE_EMULATOR_HOST: %s", os.getenv('FIRESTORE_EMULATOR_HOST'))
+    logger.info("GCLOUD_PROJECT: %s", os.getenv('GCLOUD_PROJECT'))
+    logger.info("GOOGLE_CLOUD_PROJECT: %s", os.getenv('GOOGLE_CLOUD_PROJECT'))
     
     try:
         # Check if running in emulator environment
         if os.getenv('FIRESTORE_EMULATOR_HOST'):
             logger.info("Initializing Firebase Admin SDK for emulator environment")
-            
-            # Create a mock credential for emulator
-            class MockCredential(credentials.Base):
-                def get_credential(self):
-                    # Return a mock credential that satisfies the SDK
-                    from google.oauth2 import credentials as oauth2_credentials
-                    return oauth2_credentials.Credentials(token='mock-token')
-            
             cred = MockCredential()
             firebase_admin.initialize_app(
                 credential=cred,
@@ -58,13 +70,8 @@ if not firebase_admin._apps:
             firebase_admin.initialize_app(cred)
             logger.info("Firebase Admin SDK initialized successfully")
     except Exception as e:
-        logger.warning(f"Failed to initialize with credentials, trying emulator mode: {e}")
+        logger.warning("Failed to initialize with credentials, trying emulator mode: %s", e)
         # Fallback to emulator mode with mock credentials
-        class MockCredential(credentials.Base):
-            def get_credential(self):
-                from google.oauth2 import credentials as oauth2_credentials
-                return oauth2_credentials.Credentials(token='mock-token')
-        
         cred = MockCredential()
         firebase_admin.initialize_app(
             credential=cred,
@@ -82,81 +89,170 @@ def get_db():
         try:
             # Make sure we're using the emulator
             if os.getenv('FIRESTORE_EMULATOR_HOST'):
-                logger.info(f"Connecting to Firestore emulator at {os.getenv('FIRESTORE_EMULATOR_HOST')}")
+                logger.info("Connecting to Firestore emulator at %s", os.getenv('FIRESTORE_EMULATOR_HOST'))
             db = firestore.client()
             logger.info("Firestore client initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize Firestore client: {e}")
+            logger.error("Failed to initialize Firestore client: %s", e)
             raise
     return db
 
+def _prewarm_firestore():
+    """Open the Firestore channel with a cheap read so the first request skips the handshake"""
+    try:
+        get_db().collection("users").document("_warm").get()
+        logger.info("Firestore connection prewarmed")
+    except Exception as e:
+        logger.warning("Firestore prewarm failed: %s", e)
+
 def get_config_data():
-    """Load configuration data from Firestore"""
+    """Load configuration data from Firestore. Raises if the collections cannot be read."""
     try:
         logger.info("Loading initial data from Firestore collections...")
         db = get_db()
         
+        # The three collections are independent, so they are read concurrently
+        # and the load waits on one round trip instead of three in sequence
+        logger.info("Loading styles, colors and sizes collections...")
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            style_docs, color_docs, size_docs = executor.map(
+                lambda name: list(db.collection(name).stream()),
+                ("styles", "colors", "sizes")
+            )
+        
         # Load styles
-        logger.info("Loading styles collection...")
         styles = set()
-        style_docs = db.collection("styles").stream()
         for doc in style_docs:
             styles.add(doc.id)
-            logger.debug(f"Loaded style: {doc.id}")
+            logger.debug("Loaded style: %s", doc.id)
         
         # Load colors
-        logger.info("Loading colors collection...")
         colors = set()
-        color_docs = db.collection("colors").stream()
         for doc in color_docs:
             colors.add(doc.id)
-            logger.debug(f"Loaded color: {doc.id}")
+            logger.debug("Loaded color: %s", doc.id)
         
         # Load sizes
-        logger.info("Loading sizes collection...")
         sizes = {}
-        size_docs = db.collection("sizes").stream()
         for doc in size_docs:
             doc_data = doc.to_dict()
             if doc_data and "credits" in doc_data:
                 sizes[doc.id] = doc_data["credits"]
-                logger.debug(f"Loaded size: {doc.id} with {doc_data['credits']} credits")
+                logger.debug("Loaded size: %s with %s credits", doc.id, doc_data["credits"])
         
-        logger.info(f"Successfully loaded initial data - Styles: {len(styles)}, Colors: {len(colors)}, Sizes: {len(sizes)}")
-        logger.info(f"Available styles: {styles}")
-        logger.info(f"Available colors: {colors}")
-        logger.info(f"Available sizes and costs: {sizes}")
-        return styles, colors, sizes
+        logger.info("Successfully loaded initial data - Styles: %s, Colors: %s, Sizes: %s", len(styles), len(colors), len(sizes))
+        logger.info("Available styles: %s", styles)
+        logger.info("Available colors: %s", colors)
+        logger.info("Available sizes and costs: %s", sizes)
+        # Read-only containers: the catalogs are shared by every request and
+        # replaced wholesale on refresh, never mutated in place
+        return frozenset(styles), frozenset(colors), MappingProxyType(sizes)
     except Exception as e:
-        logger.critical(f"Could not load initial data from Firestore: {e}", exc_info=True)
-        logger.critical(f"Error type: {type(e).__name__}")
-        logger.critical(f"Error details: {str(e)}")
-        return set(), set(), {}
+        logger.critical("Could not load initial data from Firestore: %s", e, exc_info=True)
+        logger.critical("Error type: %s", type(e).__name__)
+        logger.critical("Error details: %s", e)
+        # Re-raise rather than return empty catalogs: those would be cached and
+        # reject every request as invalid until the next refresh
+        raise
 
 # Global variables - initialized when first accessed
 STYLES, COLORS, SIZES = None, None, None
 
+# The loaded catalogs together with the rendered listings of their values used in
+# validation error messages: (styles, colors, sizes, styles listing, colors listing,
+# sizes listing). Replaced as one tuple on every (re)load, so a request that reads
+# it once validates and reports against a consistent set.
+_CATALOG_SNAPSHOT = None
+
+# Fields createGenerationRequest requires, in the order they are reported when missing
+REQUIRED_FIELDS = ("userId", "model", "style", "color", "size")
+
+# Models accepted by createGenerationRequest, keyed by their request value
+MODELS_BY_VALUE = {model.value: model for model in ImageModels}
+
+# Rendered list of the valid models used in validation error messages
+_MODELS_LISTING = str(list(MODELS_BY_VALUE))
+
+# How long the loaded catalogs are trusted before they are read again
+CONFIG_TTL_SECONDS = float(os.getenv("CONFIG_TTL_SECONDS", 300))
+_config_expires_at = 0.0
+
+# Serializes the initial catalog load and claims of the background refresh
+_config_refresh_lock = threading.Lock()
+_config_refreshing = False
+
+def _load_config():
+    """Load the catalogs into the module globals and restart the TTL"""
+    global STYLES, COLORS, SIZES, _CATALOG_SNAPSHOT, _config_expires_at
+    styles, colors, sizes = get_config_data()
+    _CATALOG_SNAPSHOT = (styles, colors, sizes, str(list(styles)), str(list(colors)), str(list(sizes)))
+    STYLES, COLORS, SIZES = styles, colors, sizes
+    _config_expires_at = time.monotonic() + CONFIG_TTL_SECONDS
+
+def _refresh_config_in_background():
+    """Reload the catalogs on a background thread; used once they have expired"""
+    global _config_refreshing
+    try:
+        _load_config()
+        logger.info("Configuration data refreshed in the background")
+    except Exception:
+        # The current catalogs stay in use; the next request retries the refresh
+        logger.warning("Background configuration refresh failed - keeping the current catalogs")
+    finally:
+        _config_refreshing = False
+
 def ensure_config_loaded():
-    """Ensure configuration data is loaded"""
-    global STYLES, COLORS, SIZES
+    """
+    Ensure configuration data is loaded. The first call loads it synchronously;
+    once it is older than CONFIG_TTL_SECONDS it is refreshed on a background
+    thread while callers keep using the current catalogs.
+    
+    Concurrent requests on a cold instance wait for a single initial load instead
+    of each reading the catalogs themselves.
+    """
+    global _config_refreshing
     if STYLES is None or COLORS is None or SIZES is None:
-        STYLES, COLORS, SIZES = get_config_data()
+        with _config_refresh_lock:
+            # Checked again under the lock: another request may have loaded them
+            if STYLES is None or COLORS is None or SIZES is None:
+                _load_config()
+    elif time.monotonic() >= _config_expires_at:
+        with _config_refresh_lock:
+            if _config_refreshing:
+                return
+            _config_refreshing = True
+        threading.Thread(target=_refresh_config_in_background, daemon=True).start()
+
+
+def _json_response(payload, status: int = 200) -> https_fn.Response:
+    """
+    Serializes `payload` compactly into a JSON response. Values json cannot encode
+    (timestamps, the SERVER_TIMESTAMP sentinel) are written with str().
+    """
+    return https_fn.Response(
+        json.dumps(payload, separators=(",", ":"), default=str),
+        status=status,
+        mimetype="application/json"
+    )
 
 
-@https_fn.on_request()
+@https_fn.on_request(**HTTP_FUNCTION_OPTIONS)
 def createGenerationRequest(req: https_fn.Request) -> https_fn.Response:
     """
     Handles AI image generation requests, manages credits, and simulates generation.
     """
-    logger.info("=== Starting createGenerationRequest function ===")
-    
     # 1. Extract and Validate Input
+    # `req.json` reuses the body the request object has already parsed and cached.
+    # A plain Flask request still raises on a malformed body, hence the guard.
     try:
-        data = req.get_json()
-        logger.info(f"Received request data: {data}")
+        data = req.json
     except Exception as e:
-        logger.error(f"Failed to parse JSON request body: {e}")
+        logger.error("Failed to parse JSON request body: %s", e)
         return https_fn.Response("Invalid JSON in request body.", status=400)
+    if not isinstance(data, dict):
+        logger.warning("Request body is missing or not a JSON object")
+        return https_fn.Response("Invalid JSON in request body.", status=400)
+    logger.info("Received request data: %s", data)
     
     user_id = data.get("userId")
     model = data.get("model")
@@ -165,115 +261,101 @@ def createGenerationRequest(req: https_fn.Request) -> https_fn.Response:
     size = data.get("size")
     prompt = data.get("prompt") # Optional but good to have
 
-    logger.info(f"Request parameters - User: {user_id}, Model: {model}, Style: {style}, Color: {color}, Size: {size}, Prompt: {prompt}")
+    logger.info("Request parameters - User: %s, Model: %s, Style: %s, Color: %s, Size: %s, Prompt: %s", user_id, model, style, color, size, prompt)
 
     # Validate required fields
-    if not all([user_id, model, style, color, size]):
-        missing_fields = []
-        if not user_id: missing_fields.append("userId")
-        if not model: missing_fields.append("model")
-        if not style: missing_fields.append("style")
-        if not color: missing_fields.append("color")
-        if not size: missing_fields.append("size")
-        logger.warning(f"Missing required fields: {missing_fields}")
+    if not (user_id and model and style and color and size):
+        missing_fields = [field for field in REQUIRED_FIELDS if not data.get(field)]
+        logger.warning("Missing required fields: %s", missing_fields)
         return https_fn.Response(f"Missing required fields: {missing_fields}", status=400)
 
+    # The catalog lookups below need hashable values and the user id names a
+    # document, so lists, objects and numbers are rejected here as a bad request
+    non_string_fields = [field for field in REQUIRED_FIELDS if not isinstance(data[field], str)]
+    if non_string_fields:
+        logger.warning("Required fields with non-string values: %s", non_string_fields)
+        return https_fn.Response(f"Required fields must be strings: {non_string_fields}", status=400)
+
     # Ensure config is loaded and validate
-    ensure_config_loaded()
+    try:
+        ensure_config_loaded()
+    except Exception:
+        return https_fn.Response("Configuration is temporarily unavailable, please retry.", status=503)
+    
+    # Read the catalogs and their listings once: a background refresh may replace
+    # them while this request is validated and priced
+    styles, colors, sizes, styles_listing, colors_listing, sizes_listing = _CATALOG_SNAPSHOT
     
-    # Validate style, color, and size
-    if style not in STYLES:
-        logger.warning(f"Invalid style '{style}'. Available styles: {STYLES}")
-        return https_fn.Response(f"Invalid style '{style}'. Available styles: {list(STYLES)}", status=400)
+    # Validate style, color, size and model, reporting every invalid field at once
+    validation_errors = []
+    if style not in styles:
+        validation_errors.append(f"Invalid style '{style}'. Available styles: {styles_listing}")
     
-    if color not in COLORS:
-        logger.warning(f"Invalid color '{color}'. Available colors: {COLORS}")
-        return https_fn.Response(f"Invalid color '{color}'. Available colors: {list(COLORS)}", status=400)
+    if color not in colors:
+        validation_errors.append(f"Invalid color '{color}'. Available colors: {colors_listing}")
     
-    if size not in SIZES:
-        logger.warning(f"Invalid size '{size}'. Available sizes: {list(SIZES.keys())}")
-        return https_fn.Response(f"Invalid size '{size}'. Available sizes: {list(SIZES.keys())}", status=400)
+    # A single lookup both validates the size and prices it
+    credit_cost = sizes.get(size)
+    if credit_cost is None:
+        validation_errors.append(f"Invalid size '{size}'. Available sizes: {sizes_listing}")
     
-    if model not in [ImageModels.model_a.value, ImageModels.model_b.value]:
-        logger.warning(f"Invalid model '{model}'. Available models: {[ImageModels.model_a.value, ImageModels.model_b.value]}")
-        return https_fn.Response(f"Invalid model '{model}'. Please use one of {[ImageModels.model_a.value, ImageModels.model_b.value]}", status=400)
+    model_enum = MODELS_BY_VALUE.get(model)
+    if model_enum is None:
+        validation_errors.append(f"Invalid model '{model}'. Please use one of {_MODELS_LISTING}")
+    
+    if validation_errors:
+        message = "; ".join(validation_errors)
+        logger.warning("Invalid generation request: %s", message)
+        return https_fn.Response(message, status=400)
 
     logger.info("Input validation passed successfully")
 
-    # 2. Ensure config is loaded and calculate cost
-    ensure_config_loaded()
-    credit_cost = SIZES[size]
-    logger.info(f"Credit cost for size '{size}': {credit_cost}")
+    # 2. Cost was resolved while validating the size above
+    logger.info("Credit cost for size '%s': %s", size, credit_cost)
     
     db = get_db()
+    # The deduction reads the user and raises NOT_FOUND (mapped to 404 below)
+    # if it does not exist, so there is no separate existence check here
     user_ref = db.collection("users").document(user_id)
-    logger.info(f"Checking if user '{user_id}' exists...")
-
-    # Check if the user exists before proceeding
-    user_snapshot = user_ref.get()
-    if not user_snapshot.exists:
-        logger.warning(f"User '{user_id}' not found in database")
-        return https_fn.Response("User not found.", status=404)
 
-    logger.info(f"User '{user_id}' found, proceeding with transaction")
-
-    # 3. Firestore Transaction for Atomic Operation
+    # 3. Atomic credit deduction and generation
     try:
         generation_ref = db.collection("generationRequests").document()
-        logger.info(f"Created generation request reference: {generation_ref.id}")
+        logger.info("Created generation request reference: %s", generation_ref.id)
+
+        # The simulation has no side effects, so it runs before the commit and its
+        # outcome, success or failure, is committed together with the deduction
+        logger.info("Starting AI simulation for model: %s", model)
+        ai_model = get_ai_chat(model_enum)
+        generation_result = ai_model.create()
+        logger.info("AI simulation result: %s", generation_result)
 
-        # Run the transaction by passing the transaction function and its arguments
-        logger.info("Starting atomic transaction for credit deduction and generation...")
-        generation_id, user_id_result, credit_cost_result, data_result = _atomic_deduct_and_generate(
-            transaction=db.transaction(),
+        # Deduct the credits and write the records in one atomic commit
+        logger.info("Starting atomic commit for credit deduction and generation...")
+        generation_id = _atomic_deduct_and_generate(
+            db=db,
             user_ref=user_ref,
             credit_cost=credit_cost,
             generation_ref=generation_ref,
             data=data,
+            generation_result=generation_result,
         )
 
-        logger.info(f"Transaction completed successfully. Generation ID: {generation_id}")
-        
-        # Now trigger AI simulation outside of transaction
-        logger.info(f"Starting AI simulation for model: {data_result['model']}")
-        model_enum = next((m for m in ImageModels if m.value == data_result["model"]), None)
-        ai_model = AIChat(model=model_enum)
-        generation_result = ai_model.create()
-        logger.info(f"AI simulation result: {generation_result}")
+        logger.info("Deduction committed successfully. Generation ID: %s", generation_id)
 
         # Handle generation result
         if generation_result["success"]:
-            # Update request on success
-            logger.info(f"AI generation successful, updating request status to 'completed'")
-            update_data = {
-                "status": "completed",
-                "imageUrl": generation_result["imageUrl"],
-                "updatedAt": firestore.SERVER_TIMESTAMP,
-            }
-            logger.info(f"Updating generation request with: {update_data}")
-            db.collection("generationRequests").document(generation_id).update(update_data)
-            
             # 4. Return Success Response
             response_data = {
                 "generationRequestId": generation_id,
-                "deductedCredits": credit_cost_result,
+                "deductedCredits": credit_cost,
                 "imageUrl": generation_result["imageUrl"],
             }
-            logger.info(f"Returning success response: {response_data}")
-            return https_fn.Response(
-                json.dumps(response_data),
-                status=200,
-                mimetype="application/json"
-            )
+            logger.info("Returning success response: %s", response_data)
+            return _json_response(response_data, status=200)
         else:
-            # Refund credits on failure
-            logger.warning(f"AI generation failed, initiating credit refund for user '{user_id_result}'")
-            _refund_credits(user_id_result, generation_id, credit_cost_result)
-            
-            update_data = {"status": "failed", "updatedAt": firestore.SERVER_TIMESTAMP}
-            logger.info(f"Updating generation request status to 'failed': {update_data}")
-            db.collection("generationRequests").document(generation_id).update(update_data)
-            
+            # The failed request and its refund were committed with the deduction
+            logger.warning("AI generation failed, credits refunded for user '%s'", user_id)
             raise https_fn.HttpsError(
                 code=https_fn.FunctionsErrorCode.INTERNAL,
                 message="AI generation failed, credits refunded.",
@@ -281,8 +363,8 @@ def createGenerationRequest(req: https_fn.Request) -> https_fn.Response:
 
     except https_fn.HttpsError as e:
         # Handle specific, known errors (e.g., insufficient funds)
-        logger.warning(f"Handled HttpsError for user '{user_id}': {e.message} (code: {e.code})")
-        logger.info(f"HttpsError details - message: '{e.message}', code: {e.code}, code type: {type(e.code)}")
+        logger.warning("Handled HttpsError for user '%s': %s (code: %s)", user_id, e.message, e.code)
+        logger.info("HttpsError details - message: '%s', code: %s, code type: %s", e.message, e.code, type(e.code))
         
         # Map Firebase error codes to HTTP status codes
         status_code = 500  # Default
@@ -290,198 +372,381 @@ def createGenerationRequest(req: https_fn.Request) -> https_fn.Response:
             status_code = 400  # Bad Request for insufficient credits
         elif e.code == https_fn.FunctionsErrorCode.NOT_FOUND:
             status_code = 404
+        elif e.code == https_fn.FunctionsErrorCode.ABORTED:
+            status_code = 409  # Conflict: the balance kept changing concurrently
         elif e.code == https_fn.FunctionsErrorCode.INTERNAL:
             status_code = 500
             
-        logger.info(f"Returning HTTP status code: {status_code}")
+        logger.info("Returning HTTP status code: %s", status_code)
         return https_fn.Response(e.message, status=status_code)
     except Exception as e:
         # Handle other potential, unexpected errors
-        logger.error(f"Unexpected error in createGenerationRequest for user '{user_id}': {e}", exc_info=True)
+        logger.error("Unexpected error in createGenerationRequest for user '%s': %s", user_id, e, exc_info=True)
         return https_fn.Response("An unexpected internal error occurred.", status=500)
 
 
-@firestore.transactional
-def _atomic_deduct_and_generate(transaction, user_ref, credit_cost, generation_ref, data):
-    """
-    Atomically deducts credits, creates records, and handles generation simulation.
-    """
-    logger.info("=== Starting atomic transaction ===")
-    
-    # 1. Get user data and check credits
-    logger.info(f"Getting user data for user ID: {user_ref.id}")
-    user_snapshot = user_ref.get(transaction=transaction)
-    if not user_snapshot.exists:
-        logger.error(f"User '{user_ref.id}' not found during transaction")
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.NOT_FOUND, message="User not found."
-        )
-
-    current_credits = user_snapshot.get("credits")
-    logger.info(f"Current credits for user '{user_ref.id}': {current_credits}, Required: {credit_cost}")
-    
-    if current_credits < credit_cost:
-        logger.warning(f"Insufficient credits for user '{user_ref.id}'. Current: {current_credits}, Required: {credit_cost}")
-        logger.info(f"Credit check failed: {current_credits} < {credit_cost} = {current_credits < credit_cost}")
-        logger.info(f"About to raise HttpsError with code FAILED_PRECONDITION")
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION,
-            message="Insufficient credits.",
-        )
-
-    # 2. Deduct credits
-    new_credits = current_credits - credit_cost
-    logger.info(f"Deducting {credit_cost} credits from user '{user_ref.id}'. New balance: {new_credits}")
-    transaction.update(user_ref, {"credits": firestore.Increment(-credit_cost)})
-
-    # 3. Create generation request record (initially pending)
-    generation_data = {
-        **data,
-        "cost": credit_cost,
-        "status": "pending",
-        "createdAt": firestore.SERVER_TIMESTAMP,
-    }
-    logger.info(f"Creating generation request record with data: {generation_data}")
-    transaction.set(generation_ref, generation_data)
-
-    # 4. Log the deduction transaction
-    trans_ref = user_ref.collection("transactions").document()
-    transaction_log = {
-        "type": "deduction",
-        "credits": credit_cost,
-        "generationRequestId": generation_ref.id,
-        "timestamp": firestore.SERVER_TIMESTAMP,
-    }
-    logger.info(f"Logging deduction transaction: {transaction_log}")
-    transaction.set(trans_ref, transaction_log)
-
-    logger.info("Atomic transaction completed successfully")
-    
-    # Transaction is now complete, generation_ref document exists in Firestore
-    return generation_ref.id, user_ref.id, credit_cost, data
+# Attempts at the optimistic credit deduction before giving up on a contended balance
+DEDUCTION_MAX_ATTEMPTS = 3
+# Delay before the first retry of the deduction; doubled on each further retry
+DEDUCTION_RETRY_BASE_DELAY_SECONDS = 0.05
 
 
-def _refund_credits(user_id, generation_id, amount):
-    """
-    Refunds credits to a user and logs the transaction.
-    This runs in its own transaction.
+def _atomic_deduct_and_generate(db, user_ref, credit_cost, generation_ref, data, generation_result):
     """
-    logger.info(f"=== Starting credit refund process ===")
-    logger.info(f"Refunding {amount} credits to user '{user_id}' for generation '{generation_id}'")
+    Atomically deducts credits and creates the generation and deduction records.
     
-    db = get_db()
-    user_ref = db.collection("users").document(user_id)
+    The user is read once and the three writes are committed in one batch with a
+    precondition on the user's update time, so the commit only applies if the
+    balance has not changed since it was checked. That costs one read and one
+    commit, without the extra BeginTransaction round trip of a transaction; on a
+    concurrent change the deduction is retried with exponential backoff.
     
-    # Note: The generation request status update was moved to the caller
-    # to keep this function focused on the transactional refund part.
-
-    # Create a new transaction for the refund
-    transaction = db.transaction()
+    The generation request is written with create(), so the commit only applies
+    while `generation_ref` does not exist yet. A commit that already landed but was
+    resent (or retried here) therefore fails instead of deducting a second time.
     
-    @firestore.transactional
-    def refund_transaction(trans, ref, cost):
-        logger.info(f"Executing refund transaction for user '{ref.id}'")
-        
-        # Get current credits before refund
-        user_snapshot = ref.get(transaction=trans)
-        if user_snapshot.exists:
-            current_credits = user_snapshot.get("credits")
-            new_credits = current_credits + cost
-            logger.info(f"Current credits: {current_credits}, Adding: {cost}, New total: {new_credits}")
-        else:
-            logger.error(f"User '{ref.id}' not found during refund transaction")
-            raise Exception(f"User '{ref.id}' not found during refund")
-        
-        trans.update(ref, {"credits": firestore.Increment(cost)})
+    A successful `generation_result` is stored as a completed request. A failed one
+    is stored as a failed request with both the deduction and its refund logged,
+    and the balance is left unchanged; the user's write still carries the
+    precondition, so the logs match the balance that was checked.
+    """
+    for attempt in range(1, DEDUCTION_MAX_ATTEMPTS + 1):
+        # 1. Get user data and check credits
+        logger.info("Getting user data for user ID: %s (attempt %s)", user_ref.id, attempt)
+        user_snapshot = user_ref.get()
+        if not user_snapshot.exists:
+            logger.error("User '%s' not found", user_ref.id)
+            raise https_fn.HttpsError(
+                code=https_fn.FunctionsErrorCode.NOT_FOUND, message="User not found."
+            )
+
+        current_credits = user_snapshot.get("credits")
+        logger.info("Current credits for user '%s': %s, Required: %s", user_ref.id, current_credits, credit_cost)
         
-        # Log the refund transaction
-        refund_trans_ref = ref.collection("transactions").document()
-        refund_log = {
-            "type": "refund",
-            "credits": cost,
-            "generationRequestId": generation_id,
+        if current_credits < credit_cost:
+            logger.warning("Insufficient credits for user '%s'. Current: %s, Required: %s", user_ref.id, current_credits, credit_cost)
+            raise https_fn.HttpsError(
+                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION,
+                message="Insufficient credits.",
+            )
+
+        batch = db.batch()
+
+        # 2. Deduct credits, only if the user is unchanged since the read above.
+        # A failed generation is refunded in the same commit, so its net change is 0.
+        credits_delta = -credit_cost if generation_result["success"] else 0
+        logger.info("Deducting %s credits from user '%s'. New balance: %s", -credits_delta, user_ref.id, current_credits + credits_delta)
+        batch.update(
+            user_ref,
+            {"credits": firestore.Increment(credits_delta)},
+            option=db.write_option(last_update_time=user_snapshot.update_time),
+        )
+
+        # 3. Create generation request record, completed or failed
+        generation_data = {
+            **data,
+            "cost": credit_cost,
+            "status": "completed" if generation_result["success"] else "failed",
+            "createdAt": firestore.SERVER_TIMESTAMP,
+            "updatedAt": firestore.SERVER_TIMESTAMP,
+        }
+        if generation_result["success"]:
+            generation_data["imageUrl"] = generation_result["imageUrl"]
+        logger.info("Creating generation request record with data: %s", generation_data)
+        batch.create(generation_ref, generation_data)
+
+        # 4. Log the deduction transaction
+        trans_ref = user_ref.collection("transactions").document()
+        transaction_log = {
+            "type": "deduction",
+            "credits": credit_cost,
+            "generationRequestId": generation_ref.id,
             "timestamp": firestore.SERVER_TIMESTAMP,
         }
-        logger.info(f"Logging refund transaction: {refund_log}")
-        trans.set(refund_trans_ref, refund_log)
+        logger.info("Logging deduction transaction: %s", transaction_log)
+        batch.set(trans_ref, transaction_log)
+
+        # 5. Log the refund of a failed generation
+        if not generation_result["success"]:
+            refund_log = {**transaction_log, "type": "refund"}
+            logger.info("Logging refund transaction: %s", refund_log)
+            batch.set(user_ref.collection("transactions").document(f"refund_{generation_ref.id}"), refund_log)
+
+        try:
+            batch.commit()
+        except AlreadyExists:
+            # Only an earlier commit of this same deduction can have created the request
+            logger.warning("Generation request '%s' already committed - not deducting again", generation_ref.id)
+            return generation_ref.id
+        except FailedPrecondition:
+            # A resent commit that already landed also fails the update-time
+            # precondition; it must not be retried as a fresh deduction
+            if generation_ref.get().exists:
+                logger.warning("Generation request '%s' already committed - not deducting again", generation_ref.id)
+                return generation_ref.id
+            logger.warning("Credits of user '%s' changed during the deduction (attempt %s of %s)", user_ref.id, attempt, DEDUCTION_MAX_ATTEMPTS)
+            if attempt < DEDUCTION_MAX_ATTEMPTS:
+                time.sleep(DEDUCTION_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+            continue
+
+        logger.info("Atomic credit deduction completed successfully")
+        
+        # The batch is committed, generation_ref document exists in Firestore
+        return generation_ref.id
+
+    raise https_fn.HttpsError(
+        code=https_fn.FunctionsErrorCode.ABORTED,
+        message="Credits are being updated concurrently, please retry.",
+    )
 
-    try:
-        refund_transaction(transaction, user_ref, amount)
-        logger.info(f"Credit refund completed successfully for user '{user_id}'")
-    except Exception as e:
-        logger.error(f"Failed to refund credits for user '{user_id}': {e}", exc_info=True)
-        raise
 
+# Page sizes for the transaction history returned by getUserCredits
+TRANSACTIONS_DEFAULT_LIMIT = 50
+TRANSACTIONS_MAX_LIMIT = 500
 
-@https_fn.on_request()
+# Fields of a transaction returned by getUserCredits
+TRANSACTION_FIELDS = ["type", "credits", "generationRequestId", "timestamp"]
+
+
+@https_fn.on_request(**HTTP_FUNCTION_OPTIONS)
 def getUserCredits(req: https_fn.Request) -> https_fn.Response:
     """
     Retrieves a user's current credit balance and transaction history.
-    """
-    logger.info("=== Starting getUserCredits function ===")
     
+    The history is newest first and paginated: `limit` sets the page size
+    (default 50, at most 500) and `startAfter` takes the previous response's
+    `nextCursor`, the id of its last transaction (null once the history ends).
+    """
     # 1. Extract and Validate userId
     user_id = req.args.get("userId")
-    logger.info(f"Request for user credits - User ID: {user_id}")
+    logger.info("Request for user credits - User ID: %s", user_id)
     
     if not user_id:
         logger.warning("getUserCredits called without userId parameter")
         return https_fn.Response("userId parameter is required.", status=400)
 
+    # Page size for the transaction history, capped so one call stays bounded
+    try:
+        limit = min(int(req.args.get("limit", TRANSACTIONS_DEFAULT_LIMIT)), TRANSACTIONS_MAX_LIMIT)
+    except (TypeError, ValueError):
+        limit = 0
+    if limit < 1:
+        logger.warning("getUserCredits called with invalid limit: %s", req.args.get('limit'))
+        return https_fn.Response("limit must be a positive integer.", status=400)
+    start_after = req.args.get("startAfter")
+
     try:
         # 2. Get User Document
-        logger.info(f"Fetching user document for user '{user_id}'")
+        logger.info("Fetching user document for user '%s'", user_id)
         db = get_db()
         user_ref = db.collection("users").document(user_id)
         user_snapshot = user_ref.get()
 
         if not user_snapshot.exists:
-            logger.warning(f"User '{user_id}' not found in database")
+            logger.warning("User '%s' not found in database", user_id)
             return https_fn.Response("User not found.", status=404)
 
         # 3. Get Current Credits
         current_credits = user_snapshot.get("credits")
-        logger.info(f"Current credits for user '{user_id}': {current_credits}")
+        logger.info("Current credits for user '%s': %s", user_id, current_credits)
 
         # 4. Get Transaction History
-        logger.info(f"Fetching transaction history for user '{user_id}'")
-        transactions_ref = user_ref.collection("transactions").order_by(
+        logger.info("Fetching up to %s transactions for user '%s'", limit, user_id)
+        transactions_collection = user_ref.collection("transactions")
+        transactions_query = transactions_collection.order_by(
             "timestamp", direction=firestore.Query.DESCENDING
-        ).stream()
-
-        transactions = []
-        transaction_count = 0
-        for trans in transactions_ref:
-            trans_data = trans.to_dict()
-            transaction_info = {
-                "id": trans.id,
+        ).select(TRANSACTION_FIELDS).limit(limit)
+        
+        if start_after:
+            # Resume after the last transaction of the previous page
+            cursor_snapshot = transactions_collection.document(start_after).get()
+            if not cursor_snapshot.exists:
+                logger.warning("Unknown startAfter cursor '%s' for user '%s'", start_after, user_id)
+                return https_fn.Response("Invalid startAfter cursor.", status=400)
+            transactions_query = transactions_query.start_after(cursor_snapshot)
+        
+        transactions_ref = transactions_query.stream()
+
+        transactions = [
+            {
+                "id": trans_id,
                 "type": trans_data.get("type"),
                 "credits": trans_data.get("credits"),
                 "generationRequestId": trans_data.get("generationRequestId"),
                 "timestamp": trans_data.get("timestamp").isoformat(),
             }
-            transactions.append(transaction_info)
-            transaction_count += 1
+            for trans_id, trans_data in ((trans.id, trans.to_dict()) for trans in transactions_ref)
+        ]
 
-        logger.info(f"Retrieved {transaction_count} transactions for user '{user_id}'")
+        logger.info("Retrieved %s transactions for user '%s'", len(transactions), user_id)
 
         # 5. Return Response
+        # A full page may be followed by more; its last id is the next page's cursor
         response_data = {
             "currentCredits": current_credits,
             "transactions": transactions,
+            "nextCursor": transactions[-1]["id"] if len(transactions) == limit else None,
         }
-        logger.info(f"Returning credit information for user '{user_id}': {response_data}")
-        return https_fn.Response(
-            json.dumps(response_data),
-            status=200,
-            mimetype="application/json"
-        )
+        logger.info("Returning credit information for user '%s': %s", user_id, response_data)
+        return _json_response(response_data, status=200)
 
     except Exception as e:
-        logger.error(f"Unexpected error in getUserCredits for user '{user_id}': {e}", exc_info=True)
+        logger.error("Unexpected error in getUserCredits for user '%s': %s", user_id, e, exc_info=True)
         return https_fn.Response("An unexpected internal error occurred.", status=500)
 
 
+# Fields of a generation request read by the weekly report aggregation
+# (createdAt is the pagination cursor)
+REPORT_FIELDS = ["model", "style", "size", "status", "cost", "createdAt"]
+
+# Number of generation requests fetched per page by the weekly report
+REPORT_PAGE_SIZE = 1000
+
+
+def _stream_in_pages(query, page_size):
+    """
+    Yields the documents matched by `query` one page at a time, resuming each
+    page after the last document of the previous one. The query must be ordered.
+    """
+    last_snapshot = None
+    while True:
+        page_query = query.limit(page_size)
+        if last_snapshot is not None:
+            page_query = page_query.start_after(last_snapshot)
+        
+        page_count = 0
+        for snapshot in page_query.stream():
+            page_count += 1
+            last_snapshot = snapshot
+            yield snapshot
+        
+        if page_count < page_size:
+            return
+
+
+# Breakdowns of the weekly report and the request field each one groups by
+REPORT_GROUPS = (("byModel", "model"), ("byStyle", "style"), ("bySize", "size"))
+
+# The report aggregation logs its progress once per this many documents
+REPORT_PROGRESS_LOG_INTERVAL = 1000
+
+# Worker threads for the weekly report: the 7 per-day shard scans plus the previous-report read
+REPORT_SCAN_WORKERS = 8
+
+
+def _aggregate_requests(snapshots, shard_label=None) -> Dict:
+    """
+    Aggregates generation request snapshots into a partial report holding the
+    counters of the weekly report (rates are computed once all partials are merged).
+    `shard_label` names the shard in progress logs, since shards are scanned concurrently.
+    """
+    # Counters keyed by (group name, value); they fill the breakdowns after the loop
+    group_totals = Counter()
+    group_completed = Counter()
+    group_failed = Counter()
+    total_requests = credits_spent = credits_refunded = successful_requests = 0
+    # Checked once so the per-document debug log costs nothing when disabled
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    # Bound once so the loop does not look the methods up for every document
+    count_total = group_totals.update
+    count_completed = group_completed.update
+    count_failed = group_failed.update
+    
+    for req in snapshots:
+        data = req.to_dict()
+        get = data.get
+        total_requests += 1
+        
+        status = get("status", "unknown")
+        cost = get("cost", 0)
+        # One key per REPORT_GROUPS entry, spelled out to skip a per-document loop
+        group_keys = (
+            ("byModel", get("model", "unknown")),
+            ("byStyle", get("style", "unknown")),
+            ("bySize", get("size", "unknown")),
+        )
+
+        if debug_enabled:
+            logger.debug("Processing request %d: %s, Status=%s, Cost=%s", total_requests, group_keys, status, cost)
+        if total_requests % REPORT_PROGRESS_LOG_INTERVAL == 0:
+            logger.info("Report shard %s: aggregated %d generation requests so far", shard_label, total_requests)
+
+        # Increment total counts, then the model, style, and size breakdowns
+        count_total(group_keys)
+        if status == "completed":
+            credits_spent += cost
+            successful_requests += 1
+            count_completed(group_keys)
+        elif status == "failed":
+            credits_refunded += cost
+            count_failed(group_keys)
+    
+    partial = {
+        "totalRequests": total_requests,
+        "totalCreditsSpent": credits_spent,
+        "totalCreditsRefunded": credits_refunded,
+        "successfulRequests": successful_requests,
+        "byModel": {},
+        "byStyle": {},
+        "bySize": {},
+    }
+    for (group_name, value), total in group_totals.items():
+        partial[group_name][value] = {
+            "total": total,
+            "completed": group_completed[group_name, value],
+            "failed": group_failed[group_name, value],
+            "failureRate": 0,
+        }
+    
+    return partial
+
+
+def _merge_partial_reports(partials: List[Dict]) -> Dict:
+    """
+    Sums partial reports from `_aggregate_requests` into a single partial report.
+    """
+    merged = _aggregate_requests(())
+    for partial in partials:
+        for counter in ("totalRequests", "totalCreditsSpent", "totalCreditsRefunded", "successfulRequests"):
+            merged[counter] += partial[counter]
+        for group_name, _ in REPORT_GROUPS:
+            merged_group = merged[group_name]
+            for item_name, item in partial[group_name].items():
+                merged_item = merged_group.get(item_name)
+                if merged_item is None:
+                    merged_group[item_name] = dict(item)
+                else:
+                    merged_item["total"] += item["total"]
+                    merged_item["completed"] += item["completed"]
+                    merged_item["failed"] += item["failed"]
+    return merged
+
+
+def _fetch_previous_report(db):
+    """Returns the most recently generated report as a dict, or None if there is none"""
+    previous_reports_query = db.collection("reports").order_by(
+        "generatedAt", direction=firestore.Query.DESCENDING
+    ).limit(1).stream()
+    return next((report.to_dict() for report in previous_reports_query), None)
+
+
+def _scan_report_shard(db, start, end) -> Dict:
+    """
+    Aggregates the generation requests created in [start, end) into a partial report.
+    """
+    query = db.collection("generationRequests").where(
+        "createdAt", ">=", start
+    ).where("createdAt", "<", end)
+    # Projected to the fields the report aggregates so prompts and URLs are not
+    # transferred, and fetched in pages so no single response holds the whole shard
+    query = query.order_by("createdAt").select(REPORT_FIELDS)
+    partial = _aggregate_requests(
+        _stream_in_pages(query, REPORT_PAGE_SIZE), shard_label=start.date().isoformat()
+    )
+    logger.debug("Scanned %s generation requests created from %s to %s", partial['totalRequests'], start, end)
+    return partial
+
+
 @on_schedule(schedule="every monday 00:00")
 def scheduleWeeklyReport(event: ScheduledEvent) -> https_fn.Response:
     """
@@ -489,100 +754,72 @@ def scheduleWeeklyReport(event: ScheduledEvent) -> https_fn.Response:
     with the previous week's report, and saves it to a 'reports' collection.
     Returns the report as a dictionary.
     """
-    logger.info(f"=== Starting weekly report generation ===")
-    logger.info(f"Event details - Job name: {getattr(event, 'job_name', 'N/A')}")
+    logger.info("=== Starting weekly report generation ===")
+    logger.info("Event details - Job name: %s", getattr(event, 'job_name', 'N/A'))
 
     try:
         # 1. Define the time range for the last week
         now = datetime.now(timezone.utc)
         one_week_ago = now - timedelta(days=7)
-        logger.info(f"Report period: {one_week_ago} to {now}")
+        logger.info("Report period: %s to %s", one_week_ago, now)
 
-        # 2. Get the latest report from the previous week for anomaly comparison
-        logger.info("Fetching previous week's report for anomaly comparison")
+        # 2. Aggregate the generation requests from the last 7 days. The week is
+        # split into one shard per day and the shards are scanned concurrently,
+        # together with the read of the previous report used for anomaly comparison.
         db = get_db()
-        previous_reports_query = db.collection("reports").order_by(
-            "generatedAt", direction=firestore.Query.DESCENDING
-        ).limit(1).stream()
-        previous_report_data = next(
-            (report.to_dict() for report in previous_reports_query), None
-        )
+        logger.info("Fetching previous week's report and generation requests from the last 7 days")
+        shard_ranges = []
+        for day in range(7):
+            shard_start = one_week_ago + timedelta(days=day)
+            # The last shard ends exactly at `now`, so the report covers [one_week_ago, now)
+            shard_end = shard_start + timedelta(days=1) if day < 6 else now
+            shard_ranges.append((shard_start, shard_end))
+        
+        with ThreadPoolExecutor(max_workers=REPORT_SCAN_WORKERS) as executor:
+            previous_report_future = executor.submit(_fetch_previous_report, db)
+            partials = list(executor.map(
+                lambda shard_range: _scan_report_shard(db, *shard_range), shard_ranges
+            ))
+            previous_report_data = previous_report_future.result()
         
+        # 3. Check the previous week's report for anomaly comparison
         if previous_report_data:
             logger.info("Found previous report for comparison")
         else:
             logger.info("No previous report found - this may be the first report")
 
-        # 3. Get all generation requests from the last 7 days
-        logger.info("Fetching generation requests from the last 7 days")
-        requests_ref = db.collection("generationRequests").where(
-            "createdAt", ">=", one_week_ago
-        ).stream()
-
+        # 4. Merge the per-day shards
+        aggregate = _merge_partial_reports(partials)
+        successful_requests = aggregate["successfulRequests"]
         report = {
-            "totalRequests": 0,
-            "totalCreditsSpent": 0,
-            "totalCreditsRefunded": 0,
+            "totalRequests": aggregate["totalRequests"],
+            "totalCreditsSpent": aggregate["totalCreditsSpent"],
+            "totalCreditsRefunded": aggregate["totalCreditsRefunded"],
             "successRate": 0,
-            "byModel": {},
-            "byStyle": {},
-            "bySize": {},
+            "byModel": aggregate["byModel"],
+            "byStyle": aggregate["byStyle"],
+            "bySize": aggregate["bySize"],
             "anomalies": []
         }
-
-        # 4. Aggregate Data
-        successful_requests = 0
-        request_count = 0
-        
-        for req in requests_ref:
-            data = req.to_dict()
-            report["totalRequests"] += 1
-            request_count += 1
-            
-            model = data.get("model", "unknown")
-            style = data.get("style", "unknown")
-            size = data.get("size", "unknown")
-            status = data.get("status", "unknown")
-            cost = data.get("cost", 0)
-
-            logger.debug(f"Processing request {request_count}: Model={model}, Style={style}, Size={size}, Status={status}, Cost={cost}")
-
-            # Increment total counts
-            if status == "completed":
-                report["totalCreditsSpent"] += cost
-                successful_requests += 1
-            elif status == "failed":
-                report["totalCreditsRefunded"] += cost
-            
-            # Aggregate by model, style, and size
-            for key, value in [("byModel", model), ("byStyle", style), ("bySize", size)]:
-                if value not in report[key]:
-                    report[key][value] = {"total": 0, "completed": 0, "failed": 0, "failureRate": 0}
-                
-                report[key][value]["total"] += 1
-                if status == "completed":
-                    report[key][value]["completed"] += 1
-                elif status == "failed":
-                    report[key][value]["failed"] += 1
         
-        logger.info(f"Processed {request_count} generation requests")
+        logger.info("Processed %s generation requests", report['totalRequests'])
 
         # Calculate success & failure rates
         if report["totalRequests"] > 0:
             report["successRate"] = (successful_requests / report["totalRequests"]) * 100
-            logger.info(f"Overall success rate: {report['successRate']:.2f}%")
+            logger.info("Overall success rate: %.2f%%", report['successRate'])
             
-            for group_name, group in [("byModel", report["byModel"]), ("byStyle", report["byStyle"]), ("bySize", report["bySize"])]:
-                for item_name, item in group.items():
+            for group_name, _ in REPORT_GROUPS:
+                for item_name, item in report[group_name].items():
                     if item["total"] > 0:
                         item["failureRate"] = (item["failed"] / item["total"]) * 100
-                        logger.debug(f"{group_name} '{item_name}': {item['total']} total, {item['completed']} completed, {item['failed']} failed, {item['failureRate']:.2f}% failure rate")
+                        logger.debug("%s '%s': %d total, %d completed, %d failed, %.2f%% failure rate", group_name, item_name, item["total"], item["completed"], item["failed"], item["failureRate"])
 
         # 5. Detect Anomalies
         logger.info("Detecting anomalies by comparing with previous week")
         if previous_report_data:
             report["anomalies"] = _detect_anomalies(report, previous_report_data)
-            logger.info(f"Detected {len(report['anomalies'])} anomalies")
+            logger.info("Detected %s anomalies", len(report['anomalies']))
         else:
             report["anomalies"] = ["No previous report available for comparison"]
             logger.info("No previous report available for anomaly detection")
@@ -592,28 +829,22 @@ def scheduleWeeklyReport(event: ScheduledEvent) -> https_fn.Response:
         report_ref = db.collection("reports").document(report_id)
         report["generatedAt"] = firestore.SERVER_TIMESTAMP
         
-        logger.info(f"Saving report to Firestore with ID: {report_id}")
+        logger.info("Saving report to Firestore with ID: %s", report_id)
+        # A re-run on the same day replaces that day's report. A merge would keep
+        # breakdown entries that no longer occur, so it is written with a plain set().
         report_ref.set(report)
 
-        logger.info(f"Successfully generated and saved weekly report: {report_ref.id}")
-        logger.info(f"Report summary - Total requests: {report['totalRequests']}, Success rate: {report['successRate']:.2f}%, Credits spent: {report['totalCreditsSpent']}, Credits refunded: {report['totalCreditsRefunded']}")
+        logger.info("Successfully generated and saved weekly report: %s", report_ref.id)
+        logger.info("Report summary - Total requests: %s, Success rate: %.2f%%, Credits spent: %s, Credits refunded: %s", report['totalRequests'], report['successRate'], report['totalCreditsSpent'], report['totalCreditsRefunded'])
         
         # Return the report as a JSON response
-        return https_fn.Response(
-            json.dumps(report, default=str),
-            status=200,
-            mimetype="application/json"
-        )
+        return _json_response(report, status=200)
 
     except Exception as e:
-        logger.error(f"Error generating weekly report: {e}", exc_info=True)
+        logger.error("Error generating weekly report: %s", e, exc_info=True)
         # Return a dictionary with error info, maintaining the return type
         error_response = {"status": "error", "message": str(e), "anomalies": []}
-        return https_fn.Response(
-            json.dumps(error_response),
-            status=500,
-            mimetype="application/json"
-        )
+        return _json_response(error_response, status=500)
 
 def _detect_anomalies(current_metrics: Dict, previous_metrics: Dict) -> List[str]:
     """Compares current metrics against previous metrics to find anomalies."""
@@ -623,59 +854,68 @@ def _detect_anomalies(current_metrics: Dict, previous_metrics: Dict) -> List[str
     # Anomaly 1: Significant drop in overall success rate
     prev_success_rate = previous_metrics.get("successRate", 100)
     current_success_rate = current_metrics["successRate"]
-    logger.info(f"Comparing success rates - Previous: {prev_success_rate:.2f}%, Current: {current_success_rate:.2f}%")
+    logger.info("Comparing success rates - Previous: %.2f%%, Current: %.2f%%", prev_success_rate, current_success_rate)
     
     if prev_success_rate > 0 and \
        current_success_rate < prev_success_rate * AnomalyThresholds.SUCCESS_RATE_DROP_RATIO:
        anomaly_msg = f"Drastic drop in success rate: from {prev_success_rate:.2f}% to {current_success_rate:.2f}%"
        anomalies.append(anomaly_msg)
-       logger.warning(f"ANOMALY DETECTED: {anomaly_msg}")
+       logger.warning("ANOMALY DETECTED: %s", anomaly_msg)
 
     # Anomaly 2: Unusual spike in total requests
     prev_total_requests = previous_metrics.get("totalRequests", 0)
     current_total_requests = current_metrics["totalRequests"]
-    logger.info(f"Comparing total requests - Previous: {prev_total_requests}, Current: {current_total_requests}")
+    logger.info("Comparing total requests - Previous: %s, Current: %s", prev_total_requests, current_total_requests)
     
     if prev_total_requests > AnomalyThresholds.MIN_SAMPLES_FOR_ANOMALY and \
        current_total_requests > prev_total_requests * AnomalyThresholds.USAGE_SPIKE_MULTIPLIER:
        anomaly_msg = f"Unusual spike in total requests: {current_total_requests} this week vs {prev_total_requests} last week"
        anomalies.append(anomaly_msg)
-       logger.warning(f"ANOMALY DETECTED: {anomaly_msg}")
+       logger.warning("ANOMALY DETECTED: %s", anomaly_msg)
 
     # Anomaly 3: Unusual spike in credit consumption
     prev_credits_spent = previous_metrics.get("totalCreditsSpent", 0)
     current_credits_spent = current_metrics["totalCreditsSpent"]
-    logger.info(f"Comparing credit consumption - Previous: {prev_credits_spent}, Current: {current_credits_spent}")
+    logger.info("Comparing credit consumption - Previous: %s, Current: %s", prev_credits_spent, current_credits_spent)
     
     if prev_credits_spent > AnomalyThresholds.MIN_SAMPLES_FOR_ANOMALY and \
        current_credits_spent > prev_credits_spent * AnomalyThresholds.USAGE_SPIKE_MULTIPLIER:
        anomaly_msg = f"Unusual spike in credit consumption: {current_credits_spent} this week vs {prev_credits_spent} last week"
        anomalies.append(anomaly_msg)
-       logger.warning(f"ANOMALY DETECTED: {anomaly_msg}")
+       logger.warning("ANOMALY DETECTED: %s", anomaly_msg)
 
     # Anomaly 4: Spike in failure rate for a specific category (model, style, etc.)
     logger.info("Checking for failure rate spikes in specific categories")
     for key in ["byModel", "byStyle", "bySize"]:
         if key in previous_metrics:
-            logger.info(f"Analyzing {key} category for anomalies")
-            for item_name, current_item_data in current_metrics[key].items():
-                previous_item_data = previous_metrics[key].get(item_name)
-                if previous_item_data and previous_item_data.get("total", 0) > AnomalyThresholds.MIN_SAMPLES_FOR_ANOMALY:
-                    prev_failure_rate = previous_item_data.get("failureRate", 0)
-                    current_failure_rate = current_item_data["failureRate"]
-
-                    logger.debug(f"{key} '{item_name}': Previous failure rate: {prev_failure_rate:.2f}%, Current: {current_failure_rate:.2f}%")
-
-                    if current_failure_rate > prev_failure_rate * AnomalyThresholds.FAILURE_RATE_SPIKE_MULTIPLIER and \
-                       current_failure_rate > AnomalyThresholds.SIGNIFICANT_FAILURE_RATE:
-                        anomaly_msg = f"Spike in failure rate for {key} '{item_name}': {current_failure_rate:.2f}% this week vs {prev_failure_rate:.2f}% last week"
-                        anomalies.append(anomaly_msg)
-                        logger.warning(f"ANOMALY DETECTED: {anomaly_msg}")
+            logger.info("Analyzing %s category for anomalies", key)
+            # Only items with enough samples last week can be compared, so filter
+            # those once and look up just them in this week's breakdown
+            comparable_items = {
+                item_name: item_data
+                for item_name, item_data in previous_metrics[key].items()
+                if item_data.get("total", 0) > AnomalyThresholds.MIN_SAMPLES_FOR_ANOMALY
+            }
+            current_group = current_metrics[key]
+            for item_name, previous_item_data in comparable_items.items():
+                current_item_data = current_group.get(item_name)
+                if not current_item_data:
+                    continue
+                prev_failure_rate = previous_item_data.get("failureRate", 0)
+                current_failure_rate = current_item_data["failureRate"]
+
+                logger.debug("%s '%s': Previous failure rate: %.2f%%, Current: %.2f%%", key, item_name, prev_failure_rate, current_failure_rate)
+
+                if current_failure_rate > prev_failure_rate * AnomalyThresholds.FAILURE_RATE_SPIKE_MULTIPLIER and \
+                   current_failure_rate > AnomalyThresholds.SIGNIFICANT_FAILURE_RATE:
+                    anomaly_msg = f"Spike in failure rate for {key} '{item_name}': {current_failure_rate:.2f}% this week vs {prev_failure_rate:.2f}% last week"
+                    anomalies.append(anomaly_msg)
+                    logger.warning("ANOMALY DETECTED: %s", anomaly_msg)
     
     if not anomalies:
         anomalies.append("No significant anomalies detected this week.")
         logger.info("No significant anomalies detected")
     else:
-        logger.info(f"Total anomalies detected: {len(anomalies)}")
+        logger.info("Total anomalies detected: %s", len(anomalies))
         
     return anomalies
\ No newline at end of file
@@ -6,8 +6,9 @@ by adapting the request/response objects.
 """
 import json
 import logging
-from typing import Any, Dict
-from flask import Request, Response, make_response
+import os
+import threading
+from flask import Request, Response
 
 # Configure logging
 logging.basicConfig(
@@ -16,163 +17,202 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-logger.info("Starting to import handlers module...")
+# handlers pulls in the Firebase Admin SDK and Firestore client, so it is not
+# imported on the main thread at cold start: _prewarm loads it in the background,
+# or the first routed request does if it arrives sooner. The root endpoint can
+# then answer without paying for it.
+_DISPATCH = None
 
-# Import the actual functions from handlers
-import handlers as firebase_functions
+# Functions exposed through this wrapper
+_FUNCTION_NAMES = ("createGenerationRequest", "getUserCredits", "scheduleWeeklyReport")
 
-logger.info(f"Handlers module imported successfully. Type: {type(firebase_functions)}")
-logger.info(f"Handlers module attributes: {dir(firebase_functions)}")
+class _DummyEvent:
+    """Stand-in scheduler event used to trigger scheduled functions manually"""
+    
+    __slots__ = ("job_name", "schedule", "headers")
+    
+    def __init__(self):
+        self.job_name = "manual-trigger"
+        self.schedule = "manual"
+        self.headers = {}
+
+# Scheduled functions only read the event, so one instance serves every trigger
+_DUMMY_EVENT = _DummyEvent()
+
+def _invoke_http(handler):
+    """Wrap an HTTP function so it takes and returns Flask objects"""
+    def invoke(request):
+        return adapt_response(handler(FirebaseFunctionsAdapter(request)))
+    return invoke
 
-# Check what we have in handlers module
-if hasattr(firebase_functions, 'createGenerationRequest'):
-    logger.info(f"createGenerationRequest found. Type: {type(firebase_functions.createGenerationRequest)}")
-else:
-    logger.error("createGenerationRequest NOT found in handlers module!")
+def _invoke_scheduler(handler):
+    """Wrap a scheduled function so it can be triggered manually over HTTP"""
+    def invoke(_request):
+        firebase_response = handler(_DUMMY_EVENT)
+        return Response(
+            firebase_response.get_data(),
+            status=firebase_response.status_code,
+            headers=firebase_response.headers
+        )
+    return invoke
 
-if hasattr(firebase_functions, 'getUserCredits'):
-    logger.info(f"getUserCredits found. Type: {type(firebase_functions.getUserCredits)}")
-else:
-    logger.error("getUserCredits NOT found in handlers module!")
+# How each exposed function is invoked; anything not listed is an HTTP function
+_INVOKERS = {"scheduleWeeklyReport": _invoke_scheduler}
 
-if hasattr(firebase_functions, 'scheduleWeeklyReport'):
-    logger.info(f"scheduleWeeklyReport found. Type: {type(firebase_functions.scheduleWeeklyReport)}")
-else:
-    logger.error("scheduleWeeklyReport NOT found in handlers module!")
+def _get_dispatch():
+    """Import handlers on first use and return the function-name dispatch table"""
+    global _DISPATCH
+    if _DISPATCH is None:
+        import handlers as firebase_functions
+        
+        # Resolve the exposed functions once so each request is a single dict lookup
+        dispatch = {}
+        for name in _FUNCTION_NAMES:
+            fn = getattr(firebase_functions, name, None)
+            if fn is None:
+                logger.error("%s NOT found in handlers module!", name)
+                continue
+            dispatch[name] = _INVOKERS.get(name, _invoke_http)(fn)
+        _DISPATCH = dispatch
+    return _DISPATCH
+
+def _prewarm():
+    """Load handlers and open the Firestore channel before the first routed request"""
+    try:
+        _get_dispatch()
+        import handlers as firebase_functions
+        firebase_functions._prewarm_firestore()
+    except Exception as e:
+        logger.warning("Prewarm failed: %s", e)
+
+# Prewarm on a background thread at cold start, so the handlers import and the
+# Firestore handshake overlap the wait for the first request instead of racing
+# it; set FIRESTORE_PREWARM=0 to disable.
+if os.getenv("FIRESTORE_PREWARM", "1") == "1":
+    threading.Thread(target=_prewarm, daemon=True).start()
 
 class FirebaseFunctionsAdapter:
     """Adapter to make Flask Request compatible with Firebase Functions"""
     
+    __slots__ = ("_flask_request", "_json")
+    
     def __init__(self, flask_request: Request):
-        self.path = flask_request.path
-        self.method = flask_request.method
-        self.args = flask_request.args
-        self.headers = flask_request.headers
         self._flask_request = flask_request
-        self._json = None
+        # Parse the body once up front; Flask caches the result, and handlers
+        # read it through `json` without triggering a second parse.
+        self._json = flask_request.get_json(silent=True)
     
     def get_json(self):
         """Get JSON data from request"""
-        if self._json is None:
-            self._json = self._flask_request.get_json(silent=True)
         return self._json
     
     @property
     def json(self):
         return self.get_json()
+    
+    # Request attributes are read through from the Flask request on demand
+    @property
+    def path(self):
+        return self._flask_request.path
+    
+    @property
+    def method(self):
+        return self._flask_request.method
+    
+    @property
+    def args(self):
+        return self._flask_request.args
+    
+    @property
+    def headers(self):
+        return self._flask_request.headers
 
 def adapt_response(firebase_response):
     """Convert Firebase Functions Response to Flask Response"""
     if hasattr(firebase_response, 'get_data'):
         try:
-            body = firebase_response.get_data(as_text=True)
-            status = firebase_response.status_code
-            headers = firebase_response.headers
-            return make_response(body, status, headers)
+            return Response(
+                firebase_response.get_data(),
+                status=firebase_response.status_code,
+                headers=firebase_response.headers
+            )
         except Exception as e:
-            logger.error(f"Error adapting response with get_data: {e}", exc_info=True)
+            logger.error("Error adapting response with get_data: %s", e, exc_info=True)
 
     if hasattr(firebase_response, '_body') and hasattr(firebase_response, '_status'):
         # It's a Firebase Response object
         body = firebase_response._body
         status = firebase_response._status
         
-        # Try to parse JSON if it's a string
-        if isinstance(body, str):
-            try:
-                body = json.loads(body)
-                return make_response(json.dumps(body), status)
-            except:
-                return make_response(body, status)
-        
-        return make_response(json.dumps(body), status)
+        # String bodies are already serialized and pass through untouched; either
+        # way the response is sent as JSON
+        return _json_response(body, status)
     
     # Already a Flask response
     return firebase_response
 
+# Path prefix shared by every emulator function URL
+_PREFIX = "/demo-case-study/us-central1/"
+
+# Exact paths of the exposed functions, so routing the common case is one dict lookup
+_ROUTES = {
+    f"{_PREFIX}{name}": name
+    for name in _FUNCTION_NAMES
+}
+
+# The root response never changes, so it is serialized and encoded once at import
+_ROOT_RESPONSE_BODY = json.dumps({
+    "message": "AI Image Generation Backend API",
+    "version": "1.0.0",
+    "available_endpoints": list(_ROUTES)
+}).encode("utf-8")
+
+def _json_response(body, status: int) -> Response:
+    """Build a JSON Flask response from a payload or an already serialized body"""
+    if not isinstance(body, (str, bytes)):
+        body = json.dumps(body)
+    return Response(body, status=status, mimetype="application/json")
+
 def handle_request(request: Request) -> Response:
     """Main entry point for Functions Framework"""
     try:
-        logger.info(f"Request received: {request.method} {request.path}")
-        logger.info(f"Main module type in handle_request: {type(firebase_functions)}")
+        logger.debug("Request received: %s %s", request.method, request.path)
         
         # Handle root path
         if request.path == "/" or request.path == "":
-            return make_response(json.dumps({
-                "message": "AI Image Generation Backend API",
-                "version": "1.0.0",
-                "available_endpoints": [
-                    "/demo-case-study/us-central1/createGenerationRequest",
-                    "/demo-case-study/us-central1/getUserCredits",
-                    "/demo-case-study/us-central1/scheduleWeeklyReport"
-                ]
-            }), 200)
+            return _json_response(_ROOT_RESPONSE_BODY, 200)
         
-        # Extract function name from path
-        path_parts = request.path.strip('/').split('/')
+        path = request.path
+        function_name = _ROUTES.get(path)
+        if function_name is None:
+            if path.startswith(_PREFIX):
+                # Known prefix with a trailing slash or extra segments: slice the
+                # function name off it instead of splitting the whole path
+                function_name = path[len(_PREFIX):].partition('/')[0]
+            else:
+                # Other project or region: the third path segment names the function
+                path_parts = path.strip('/').split('/')
+                function_name = path_parts[2] if len(path_parts) >= 3 else ""
+            if not function_name:
+                logger.warning("Invalid path format: %s", path)
+                return Response("Invalid path format", status=400)
         
-        if len(path_parts) >= 3:
-            function_name = path_parts[2]
-            logger.info(f"Routing to function: {function_name}")
-            logger.info(f"Checking if firebase_functions has attribute {function_name}: {hasattr(firebase_functions, function_name)}")
-            
-            # Create adapted request
-            adapted_request = FirebaseFunctionsAdapter(request)
-            
-            try:
-                if function_name == "createGenerationRequest":
-                    logger.info(f"Attempting to call firebase_functions.createGenerationRequest...")
-                    logger.info(f"firebase_functions type: {type(firebase_functions)}")
-                    logger.info(f"Has createGenerationRequest: {hasattr(firebase_functions, 'createGenerationRequest')}")
-                    if hasattr(firebase_functions, 'createGenerationRequest'):
-                        logger.info(f"createGenerationRequest type: {type(firebase_functions.createGenerationRequest)}")
-                    # Call the function directly
-                    response = firebase_functions.createGenerationRequest(adapted_request)
-                    return adapt_response(response)
-                    
-                elif function_name == "getUserCredits":
-                    logger.info(f"Attempting to call firebase_functions.getUserCredits...")
-                    logger.info(f"firebase_functions type: {type(firebase_functions)}")
-                    logger.info(f"Has getUserCredits: {hasattr(firebase_functions, 'getUserCredits')}")
-                    if hasattr(firebase_functions, 'getUserCredits'):
-                        logger.info(f"getUserCredits type: {type(firebase_functions.getUserCredits)}")
-                    # Call the function directly
-                    response = firebase_functions.getUserCredits(adapted_request)
-                    return adapt_response(response)
-                    
-                elif function_name == "scheduleWeeklyReport":
-                    # For testing purposes, allow manual trigger
-                    class DummyEvent:
-                        def __init__(self):
-                            self.job_name = "manual-trigger"
-                            self.schedule = "manual"
-                            self.headers = {}  # Add headers attribute
-                    
-                    # Directly call the function and get the https_fn.Response
-                    firebase_response = firebase_functions.scheduleWeeklyReport(DummyEvent())
-                    
-                    # Manually construct the Flask response from the https_fn.Response
-                    body = firebase_response.get_data(as_text=True)
-                    status = firebase_response.status_code
-                    headers = firebase_response.headers
-                    
-                    return make_response(body, status, headers)
-                    
-                else:
-                    logger.warning(f"Unknown function name: {function_name}")
-                    return make_response(f"Unknown function: {function_name}", 404)
-                    
-            except Exception as e:
-                logger.error(f"Error handling {function_name}: {str(e)}", exc_info=True)
-                return make_response(json.dumps({"error": str(e)}), 500)
-                
-        else:
-            logger.warning(f"Invalid path format: {request.path}")
-            return make_response("Invalid path format", 400)
+        logger.debug("Routing to function: %s", function_name)
+        
+        invoke = _get_dispatch().get(function_name)
+        if invoke is None:
+            logger.warning("Unknown function name: %s", function_name)
+            return Response(f"Unknown function: {function_name}", status=404)
+        
+        try:
+            return invoke(request)
+        except Exception as e:
+            logger.error("Error handling %s: %s", function_name, e, exc_info=True)
+            return _json_response({"error": str(e)}, 500)
             
     except Exception as e:
-        logger.error(f"Unhandled error: {str(e)}", exc_info=True)
-        return make_response("An unexpected internal error occurred.", 500)
+        logger.error("Unhandled error: %s", e, exc_info=True)
+        return Response("An unexpected internal error occurred.", status=500)
 
 # Main function for Functions Framework
 def main(request: Request) -> Response:
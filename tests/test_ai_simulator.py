@@ -0,0 +1,87 @@
+import logging
+import pytest
+from functions.ai_simulator import AIChat, _GEOMETRIC_SKIP_MAX_RATE
+from functions.config import ImageModels
+
+# Configure logging for this test module
+logger = logging.getLogger(__name__)
+
+logger.info("=== Loading test_ai_simulator module ===")
+
+BATCH_SIZE = 20000
+
+
+def _failures(results):
+    """Counts the failed generations in a batch of results."""
+    return sum(1 for result in results if not result["success"])
+
+
+@pytest.mark.parametrize("failure_rate, expected_success", [(0.0, True), (1.0, False)])
+def test_create_batch_fixed_outcome(failure_rate, expected_success):
+    """
+    Rates of 0 and 1 always produce the same outcome, in a batch of the requested size.
+    """
+    logger.info(f"=== Starting test_create_batch_fixed_outcome (failure rate {failure_rate}) ===")
+    chat = AIChat(ImageModels.model_a, failure_rate=failure_rate)
+
+    results = chat.create_batch(100)
+
+    assert len(results) == 100
+    assert all(result["success"] is expected_success for result in results)
+    assert chat.create_batch(0) == []
+
+
+@pytest.mark.parametrize("failure_rate", [
+    0.05,   # rare failures, geometric-skip path
+    0.95,   # rare successes, geometric-skip path
+    0.5,    # above _GEOMETRIC_SKIP_MAX_RATE, one draw per item
+])
+def test_create_batch_failure_rate(failure_rate):
+    """
+    The share of failures in a large batch matches the configured rate, on both the
+    geometric-skip path and the per-item path.
+    """
+    logger.info(f"=== Starting test_create_batch_failure_rate (failure rate {failure_rate}) ===")
+    chat = AIChat(ImageModels.model_b, failure_rate=failure_rate, seed=1234)
+
+    results = chat.create_batch(BATCH_SIZE)
+    failures = _failures(results)
+    logger.info(f"{failures} of {BATCH_SIZE} generations failed")
+
+    assert len(results) == BATCH_SIZE
+    # Within 5 standard deviations of the expected count
+    expected = BATCH_SIZE * failure_rate
+    tolerance = 5 * (BATCH_SIZE * failure_rate * (1 - failure_rate)) ** 0.5
+    assert abs(failures - expected) <= tolerance
+    for result in results:
+        if result["success"]:
+            assert result["imageUrl"]
+        else:
+            assert result["error"]
+
+
+def test_geometric_skip_threshold_covers_test_rates():
+    """
+    Guards the parametrization above: 0.05 and 0.95 must take the geometric-skip
+    path, and 0.5 the per-item path.
+    """
+    assert min(0.05, 0.95) <= _GEOMETRIC_SKIP_MAX_RATE < 0.5
+
+
+@pytest.mark.parametrize("failure_rate", [0.05, 0.5])
+def test_seeded_simulators_are_reproducible(failure_rate):
+    """
+    Simulators created with the same seed produce the same outcomes, for single
+    generations and for batches.
+    """
+    logger.info(f"=== Starting test_seeded_simulators_are_reproducible (failure rate {failure_rate}) ===")
+    first = AIChat(ImageModels.model_a, failure_rate=failure_rate, seed=42)
+    second = AIChat("model-a", failure_rate=failure_rate, seed=42)
+
+    assert [first.create()["success"] for _ in range(200)] == [second.create()["success"] for _ in range(200)]
+    assert [r["success"] for r in first.create_batch(1000)] == [r["success"] for r in second.create_batch(1000)]
+
+    # A different seed gives a different stream
+    reseeded = AIChat(ImageModels.model_a, failure_rate=failure_rate, seed=42)
+    other = AIChat(ImageModels.model_a, failure_rate=failure_rate, seed=43)
+    assert [r["success"] for r in reseeded.create_batch(1000)] != [r["success"] for r in other.create_batch(1000)]
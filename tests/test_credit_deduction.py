@@ -1,7 +1,11 @@
 import logging
+import os
 from unittest.mock import patch
 import pytest
 from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore_v1.batch import WriteBatch
+from google.cloud.firestore_v1.document import DocumentReference
 
 # Configure logging for this test module
 logger = logging.getLogger(__name__)
@@ -132,4 +136,125 @@ def test_successful_credit_deduction(mock_ai_create, app_client, db, valid_paylo
     
     logger.info("=== test_successful_credit_deduction completed successfully ===")
 
-logger.info("test_credit_deduction module loaded successfully")
\ No newline at end of file
+logger.info("test_credit_deduction module loaded successfully")
+
+def _payload_for(user_id):
+    """A valid generation request for `user_id` costing 3 credits."""
+    return {
+        "userId": user_id,
+        "model": "model-a",
+        "style": "anime",
+        "color": "vibrant",
+        "size": "1024x1024",
+        "prompt": "A test prompt for concurrent deductions."
+    }
+
+
+def _concurrent_update_on_read(db, user_id, credits_taken, max_updates=None):
+    """
+    Returns a replacement for DocumentReference.get that, after each read of the
+    user's document, takes `credits_taken` credits in a separate write. This lands
+    between the deduction's read and its commit, like a concurrent request would.
+    """
+    original_get = DocumentReference.get
+    user_path = db.collection("users").document(user_id).path
+    updates = []
+
+    def get_then_update(self, *args, **kwargs):
+        snapshot = original_get(self, *args, **kwargs)
+        if self.path == user_path and (max_updates is None or len(updates) < max_updates):
+            updates.append(credits_taken)
+            db.collection("users").document(user_id).update({"credits": firestore.Increment(-credits_taken)})
+            logger.info(f"Concurrent update took {credits_taken} credits from '{user_id}'")
+        return snapshot
+
+    return get_then_update, updates
+
+
+def _user_records(db, user_id):
+    """Returns the user's credits, transactions and generation requests."""
+    user_ref = db.collection("users").document(user_id)
+    credits = user_ref.get().to_dict()["credits"]
+    transactions = [t.to_dict() for t in user_ref.collection("transactions").stream()]
+    generation_requests = list(db.collection("generationRequests").where("userId", "==", user_id).stream())
+    return credits, transactions, generation_requests
+
+
+def test_deduction_retries_after_concurrent_update(app_client, db, managed_user):
+    """
+    A balance change between the deduction's read and its commit fails the commit's
+    precondition; the deduction is retried against the new balance and applied once.
+    """
+    logger.info("=== Starting test_deduction_retries_after_concurrent_update ===")
+    user_id = managed_user("testUserConcurrentUpdate", credits=100)
+    get_then_update, updates = _concurrent_update_on_read(db, user_id, credits_taken=10, max_updates=1)
+
+    with patch.dict(os.environ, {"AI_FAILURE_RATE": "0.0"}), \
+         patch.object(DocumentReference, "get", get_then_update):
+        response = app_client.post(BASE_URL, json=_payload_for(user_id))
+    logger.info(f"Response status code: {response.status_code}")
+
+    assert response.status_code == 200
+    assert updates == [10]
+
+    credits, transactions, generation_requests = _user_records(db, user_id)
+    logger.info(f"Final credits: {credits}, transactions: {transactions}")
+    assert credits == 87  # 100 - 10 (concurrent) - 3 (deduction)
+    assert len(transactions) == 1
+    assert transactions[0]["type"] == "deduction"
+    assert len(generation_requests) == 1
+    assert generation_requests[0].id == response.get_json()["generationRequestId"]
+
+
+def test_deduction_gives_up_on_persistent_contention(app_client, db, managed_user):
+    """
+    When the balance changes before every commit, the deduction gives up with a 409
+    and writes nothing.
+    """
+    logger.info("=== Starting test_deduction_gives_up_on_persistent_contention ===")
+    user_id = managed_user("testUserPersistentContention", credits=100)
+    get_then_update, updates = _concurrent_update_on_read(db, user_id, credits_taken=10)
+
+    with patch.dict(os.environ, {"AI_FAILURE_RATE": "0.0"}), \
+         patch.object(DocumentReference, "get", get_then_update):
+        response = app_client.post(BASE_URL, json=_payload_for(user_id))
+    logger.info(f"Response status code: {response.status_code}")
+
+    assert response.status_code == 409
+    assert "Credits are being updated concurrently" in response.get_data(as_text=True)
+
+    credits, transactions, generation_requests = _user_records(db, user_id)
+    assert credits == 100 - 10 * len(updates)
+    assert transactions == []
+    assert generation_requests == []
+
+
+def test_replayed_deduction_commit_is_not_applied_twice(app_client, db, managed_user):
+    """
+    A commit that landed but is reported as failed (as when a resent commit hits the
+    stale precondition) must not lead to a second deduction.
+    """
+    logger.info("=== Starting test_replayed_deduction_commit_is_not_applied_twice ===")
+    user_id = managed_user("testUserReplayedCommit", credits=100)
+    original_commit = WriteBatch.commit
+    replays = []
+
+    def commit_then_fail_once(self, *args, **kwargs):
+        result = original_commit(self, *args, **kwargs)
+        if not replays:
+            replays.append(True)
+            raise FailedPrecondition("Simulated resent commit after a lost response")
+        return result
+
+    with patch.dict(os.environ, {"AI_FAILURE_RATE": "0.0"}), \
+         patch.object(WriteBatch, "commit", commit_then_fail_once):
+        response = app_client.post(BASE_URL, json=_payload_for(user_id))
+    logger.info(f"Response status code: {response.status_code}")
+
+    assert response.status_code == 200
+    assert replays == [True]
+
+    credits, transactions, generation_requests = _user_records(db, user_id)
+    assert credits == 97  # deducted exactly once
+    assert len(transactions) == 1
+    assert len(generation_requests) == 1
@@ -1,6 +1,6 @@
 import logging
 import pytest
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from firebase_admin import firestore
 
 # Configure logging for this test module
@@ -155,4 +155,138 @@ def test_get_user_credits_missing_userid(app_client):
     assert b"userId parameter is required" in response.data
     logger.info("Error message verification passed")
     
-    logger.info("test_get_user_credits_missing_userid completed successfully")
\ No newline at end of file
+    logger.info("test_get_user_credits_missing_userid completed successfully")
+
+
+def _create_user_with_history(db, managed_user, user_id, count):
+    """
+    Creates a user with `count` deduction transactions one minute apart, so their
+    order is known: `tx000` is the oldest and the highest index is the newest.
+    Returns the transaction ids, newest first.
+    """
+    managed_user(user_id, credits=count)
+    trans_collection = db.collection("users").document(user_id).collection("transactions")
+    base_time = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    
+    logger.info(f"Creating {count} transactions for user '{user_id}'")
+    batch = db.batch()
+    for i in range(count):
+        batch.set(trans_collection.document(f"tx{i:03d}"), {
+            "type": "deduction",
+            "credits": 1,
+            "generationRequestId": f"gen{i:03d}",
+            "timestamp": base_time + timedelta(minutes=i)
+        })
+        # A batch holds at most 500 writes
+        if (i + 1) % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    
+    return [f"tx{i:03d}" for i in reversed(range(count))]
+
+
+def test_get_user_credits_default_page_size(app_client, db, managed_user):
+    """
+    Without a limit, only the 50 newest transactions are returned.
+    """
+    logger.info("=== Starting test_get_user_credits_default_page_size ===")
+    user_id = "userWithLongHistory"
+    expected_ids = _create_user_with_history(db, managed_user, user_id, 51)
+    
+    response = app_client.get(f"{BASE_URL}?userId={user_id}")
+    logger.info(f"Response status code: {response.status_code}")
+    
+    assert response.status_code == 200
+    trans_ids = [t["id"] for t in response.get_json()["transactions"]]
+    assert trans_ids == expected_ids[:50]
+
+
+def test_get_user_credits_limit_is_capped(app_client, db, managed_user):
+    """
+    A limit above the maximum page size is capped to 500 transactions.
+    """
+    logger.info("=== Starting test_get_user_credits_limit_is_capped ===")
+    user_id = "userWithVeryLongHistory"
+    expected_ids = _create_user_with_history(db, managed_user, user_id, 501)
+    
+    response = app_client.get(f"{BASE_URL}?userId={user_id}&limit=1000")
+    logger.info(f"Response status code: {response.status_code}")
+    
+    assert response.status_code == 200
+    trans_ids = [t["id"] for t in response.get_json()["transactions"]]
+    assert trans_ids == expected_ids[:500]
+
+
+@pytest.mark.parametrize("limit", ["abc", "0", "-1", "2.5"])
+def test_get_user_credits_invalid_limit(app_client, db, managed_user, limit):
+    """
+    A limit that is not a positive integer is rejected.
+    """
+    logger.info(f"=== Starting test_get_user_credits_invalid_limit (limit={limit}) ===")
+    user_id = managed_user("userWithInvalidLimit", credits=10)
+    
+    response = app_client.get(f"{BASE_URL}?userId={user_id}&limit={limit}")
+    logger.info(f"Response status code: {response.status_code}")
+    
+    assert response.status_code == 400
+    assert b"limit must be a positive integer" in response.data
+
+
+def test_get_user_credits_unknown_cursor(app_client, db, managed_user):
+    """
+    A startAfter cursor that is not one of the user's transactions is rejected.
+    """
+    logger.info("=== Starting test_get_user_credits_unknown_cursor ===")
+    user_id = "userWithUnknownCursor"
+    _create_user_with_history(db, managed_user, user_id, 3)
+    
+    response = app_client.get(f"{BASE_URL}?userId={user_id}&startAfter=noSuchTransaction")
+    logger.info(f"Response status code: {response.status_code}")
+    
+    assert response.status_code == 400
+    assert b"Invalid startAfter cursor" in response.data
+
+
+def test_get_user_credits_second_page(app_client, db, managed_user):
+    """
+    The page after a cursor continues the history without repeating transactions.
+    """
+    logger.info("=== Starting test_get_user_credits_second_page ===")
+    user_id = "userWithTwoPages"
+    expected_ids = _create_user_with_history(db, managed_user, user_id, 5)
+    
+    first_page = app_client.get(f"{BASE_URL}?userId={user_id}&limit=3").get_json()
+    first_ids = [t["id"] for t in first_page["transactions"]]
+    logger.info(f"First page: {first_ids}")
+    
+    # The cursor is the id of the last transaction of the previous page
+    response = app_client.get(f"{BASE_URL}?userId={user_id}&limit=3&startAfter={first_ids[-1]}")
+    assert response.status_code == 200
+    second_ids = [t["id"] for t in response.get_json()["transactions"]]
+    logger.info(f"Second page: {second_ids}")
+    
+    assert first_ids == expected_ids[:3]
+    assert second_ids == expected_ids[3:]
+    assert not set(first_ids) & set(second_ids)
+
+
+def test_get_user_credits_next_cursor(app_client, db, managed_user):
+    """
+    A full page carries the id of its last transaction as `nextCursor`;
+    the page that ends the history has no cursor.
+    """
+    logger.info("=== Starting test_get_user_credits_next_cursor ===")
+    user_id = "userWithCursor"
+    expected_ids = _create_user_with_history(db, managed_user, user_id, 5)
+    
+    first_page = app_client.get(f"{BASE_URL}?userId={user_id}&limit=3").get_json()
+    logger.info(f"First page: {first_page}")
+    assert first_page["nextCursor"] == expected_ids[2]
+    
+    last_page = app_client.get(
+        f"{BASE_URL}?userId={user_id}&limit=3&startAfter={first_page['nextCursor']}"
+    ).get_json()
+    logger.info(f"Last page: {last_page}")
+    assert [t["id"] for t in last_page["transactions"]] == expected_ids[3:]
+    assert last_page.get("nextCursor") is None
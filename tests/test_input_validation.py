@@ -1,5 +1,6 @@
 import logging
 import pytest
+import functions.handlers as handlers
 
 # Configure logging for this test module
 logger = logging.getLogger(__name__)
@@ -94,4 +95,105 @@ def test_invalid_enum_values(app_client):
     
     logger.info("=== test_invalid_enum_values completed successfully ===")
 
-logger.info("test_input_validation module loaded successfully")
\ No newline at end of file
+logger.info("test_input_validation module loaded successfully")
+
+
+def test_non_string_field_values(app_client):
+    """
+    Test that non-string values for the required fields are rejected as a bad
+    request rather than failing the catalog lookups.
+    """
+    logger.info("=== Starting test_non_string_field_values ===")
+    
+    base_payload = {
+        "userId": "user1", "model": "model-a", "style": "anime",
+        "color": "vibrant", "size": "512x512", "prompt": "test"
+    }
+    
+    for field in ("userId", "model", "style", "color", "size"):
+        for value in (["x"], {"x": 1}, 42):
+            payload = {**base_payload, field: value}
+            logger.info(f"Testing payload with {field}={value!r}")
+            
+            response = app_client.post(BASE_URL, json=payload)
+            logger.info(f"Response status code: {response.status_code}")
+            
+            assert response.status_code == 400
+            assert "Required fields must be strings" in response.get_data(as_text=True)
+            assert field in response.get_data(as_text=True)
+    
+    logger.info("=== test_non_string_field_values completed successfully ===")
+
+
+def test_config_unavailable_returns_503_and_is_retried(app_client, monkeypatch):
+    """
+    Test that a failed catalog load returns 503 without caching the failure, and
+    that the next request loads the catalogs again.
+    """
+    logger.info("=== Starting test_config_unavailable_returns_503_and_is_retried ===")
+    
+    payload = {
+        "userId": "user1", "model": "model-a", "style": "Invalid Style",
+        "color": "vibrant", "size": "512x512", "prompt": "test"
+    }
+    real_get_config_data = handlers.get_config_data
+    load_attempts = []
+    
+    def failing_get_config_data():
+        load_attempts.append("failed")
+        raise RuntimeError("Simulated Firestore outage")
+    
+    def counting_get_config_data():
+        load_attempts.append("loaded")
+        return real_get_config_data()
+    
+    # Start from a cold instance, so the request has to load the catalogs
+    monkeypatch.setattr(handlers, "STYLES", None)
+    monkeypatch.setattr(handlers, "get_config_data", failing_get_config_data)
+    
+    response = app_client.post(BASE_URL, json=payload)
+    logger.info(f"Response status code: {response.status_code}")
+    assert response.status_code == 503
+    assert "Configuration is temporarily unavailable" in response.get_data(as_text=True)
+    assert handlers.STYLES is None
+    
+    # The failure was not cached: the next request loads the catalogs and validates
+    monkeypatch.setattr(handlers, "get_config_data", counting_get_config_data)
+    
+    response = app_client.post(BASE_URL, json=payload)
+    logger.info(f"Response status code: {response.status_code}")
+    assert response.status_code == 400
+    assert "Invalid style" in response.get_data(as_text=True)
+    assert load_attempts == ["failed", "loaded"]
+    assert handlers.STYLES is not None
+    
+    logger.info("=== test_config_unavailable_returns_503_and_is_retried completed successfully ===")
+
+
+def test_all_invalid_fields_are_reported(app_client):
+    """
+    Test that a request with several invalid fields gets one 400 that reports
+    every one of them.
+    """
+    logger.info("=== Starting test_all_invalid_fields_are_reported ===")
+    
+    payload = {
+        "userId": "user1", "model": "Invalid Model", "style": "Invalid Style",
+        "color": "Invalid Color", "size": "Invalid Size", "prompt": "test"
+    }
+    
+    response = app_client.post(BASE_URL, json=payload)
+    logger.info(f"Response status code: {response.status_code}")
+    
+    assert response.status_code == 400
+    response_text = response.get_data(as_text=True)
+    logger.info(f"Response text: {response_text}")
+    for expected in (
+        "Invalid model 'Invalid Model'",
+        "Invalid style 'Invalid Style'",
+        "Invalid color 'Invalid Color'",
+        "Invalid size 'Invalid Size'",
+    ):
+        assert expected in response_text
+    
+    logger.info("=== test_all_invalid_fields_are_reported completed successfully ===")
@@ -1,4 +1,5 @@
 import logging
+import os
 import pytest
 from unittest.mock import patch
 from functions.handlers import createGenerationRequest
@@ -39,10 +40,10 @@ def test_refund_on_ai_failure(app_client, db, valid_payload):
         user_ref.set({"credits": initial_credits})
 
         # --- Use patch to force AI generation failure ---
-        # We patch 'random.random' to always return 0.0, which is less than any failure rate > 0,
+        # A failure rate of 1.0 is always above the simulator's uniform draw in [0, 1),
         # thus ensuring the ai_simulator returns a failure.
-        with patch('functions.ai_simulator.random.random', return_value=0.0) as mock_random:
-            logger.info("Patching 'random.random' to force AI failure")
+        with patch.dict(os.environ, {"AI_FAILURE_RATE": "1.0"}):
+            logger.info("Setting AI_FAILURE_RATE=1.0 to force AI failure")
             
             # --- Make the request ---
             response = app_client.post(BASE_URL, json=valid_payload)
@@ -2,7 +2,7 @@ import json
 import logging
 from datetime import datetime, timedelta, timezone
 import pytest
-from functions.handlers import scheduleWeeklyReport
+from functions.handlers import scheduleWeeklyReport, _merge_partial_reports, _scan_report_shard
 
 logger = logging.getLogger(__name__)
 
@@ -103,4 +103,74 @@ def test_weekly_report_integration(db):
                 logger.info(f"Deleted {collection}/{doc_id}")
             except Exception as e:
                 logger.error(f"Error during cleanup of {collection}/{doc_id}: {e}")
-        logger.info("Test data cleanup completed.")
\ No newline at end of file
+        logger.info("Test data cleanup completed.")
+
+
+def test_weekly_report_shards_match_serial_scan(db):
+    """
+    The weekly report scans one shard per day concurrently and merges the partial
+    reports. Checks that, for requests spread over the week and placed on the day
+    boundaries, the merged counts equal those of one serial scan over the whole
+    week. The success rate, failure rates and anomaly checks are all derived from
+    these counts.
+    """
+    logger.info("=== Starting test_weekly_report_shards_match_serial_scan ===")
+    # A fixed window in the past, so requests created by other tests fall outside it
+    start = datetime(2020, 6, 1, 12, 0, tzinfo=timezone.utc)
+    end = start + timedelta(days=7)
+    one_ms = timedelta(milliseconds=1)
+    created_ids = []
+
+    requests_data = [
+        # Inside the week, including both sides of the shard boundaries
+        {"model": "model-a", "style": "anime", "size": "512x512", "cost": 1, "status": "completed", "createdAt": start},
+        {"model": "model-a", "style": "anime", "size": "512x512", "cost": 1, "status": "failed", "createdAt": start + timedelta(days=1) - one_ms},
+        {"model": "model-b", "style": "realistic", "size": "1024x1024", "cost": 3, "status": "completed", "createdAt": start + timedelta(days=1)},
+        {"model": "model-b", "style": "anime", "size": "1024x1024", "cost": 3, "status": "failed", "createdAt": start + timedelta(days=3, hours=12)},
+        {"model": "model-a", "style": "sketch", "size": "512x512", "cost": 1, "status": "completed", "createdAt": start + timedelta(days=6)},
+        {"model": "model-b", "status": "pending", "createdAt": end - one_ms},
+        # Outside the week
+        {"model": "model-a", "style": "anime", "size": "512x512", "cost": 1, "status": "completed", "createdAt": start - one_ms},
+        {"model": "model-a", "style": "anime", "size": "512x512", "cost": 1, "status": "completed", "createdAt": end},
+    ]
+
+    try:
+        for req_data in requests_data:
+            _, gen_ref = db.collection("generationRequests").add({"userId": "shardTestUser", **req_data})
+            created_ids.append(gen_ref.id)
+        logger.info(f"Created {len(requests_data)} generation requests around the shard boundaries")
+
+        # The same day shards scheduleWeeklyReport scans, the last one ending at `end`
+        shard_ranges = []
+        for day in range(7):
+            shard_start = start + timedelta(days=day)
+            shard_end = shard_start + timedelta(days=1) if day < 6 else end
+            shard_ranges.append((shard_start, shard_end))
+        partials = [_scan_report_shard(db, shard_start, shard_end) for shard_start, shard_end in shard_ranges]
+        merged = _merge_partial_reports(partials)
+        logger.info(f"Merged shard report: {merged}")
+
+        serial = _scan_report_shard(db, start, end)
+        logger.info(f"Serial scan report: {serial}")
+
+        # Each request is counted by exactly one shard
+        assert [partial["totalRequests"] for partial in partials] == [2, 1, 0, 1, 0, 0, 2]
+        assert merged == serial
+
+        assert merged["totalRequests"] == 6
+        assert merged["successfulRequests"] == 3
+        assert merged["totalCreditsSpent"] == 5
+        assert merged["totalCreditsRefunded"] == 4
+        assert merged["byModel"]["model-a"] == {"total": 3, "completed": 2, "failed": 1, "failureRate": 0}
+        assert merged["byModel"]["model-b"] == {"total": 3, "completed": 1, "failed": 1, "failureRate": 0}
+        assert merged["byStyle"]["anime"]["total"] == 3
+        assert merged["byStyle"]["unknown"]["total"] == 1
+        assert merged["bySize"]["1024x1024"]["failed"] == 1
+
+    finally:
+        logger.info(f"Cleaning up {len(created_ids)} generation requests...")
+        for doc_id in created_ids:
+            try:
+                db.collection("generationRequests").document(doc_id).delete()
+            except Exception as e:
+                logger.error(f"Error during cleanup of generationRequests/{doc_id}: {e}")